@@ -1,14 +1,25 @@
+import atexit
+import json
 import os
+import threading
+import time
 import warnings
 from flask import Flask, render_template, jsonify, request, Response # type: ignore
-from modules import audio, transcribe, nlp
-from modules.geo import GeoLocator
-import soundfile # type: ignore
+from modules import audio, transcribe, nlp, metrics
+from modules.geo import GeoLocator, TokenBucket
+from modules.geocache import GeoCache
+from modules.gazetteer import Gazetteer
+from modules.pipeline import Pipeline
+from modules.workers import PoolBusyError, TranscriberPool, default_workers
+from modules.jobs import JobManager, JobQueueFullError, sse_stream
+from modules.scheduler import FeedScheduler
+from modules.capture import CaptureIngester, MicrophoneSource, ReplaySource
+from modules.ingest import MultipartFile, UploadIngester
+from modules.lazy import Lazy
+from modules.resultcache import ResultCache
+from modules.history import HistoryRecorder
+from modules import geojson
 from modules import db
-import pyaudio
-import wave
-import librosa # type: ignore
-import numpy as np
 
 # Suppress warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -17,27 +28,250 @@ os.environ['CUDA_VISIBLE_DEVICES'] = ''  # Force CPU usage
 app = Flask(__name__)
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 1
 
-# Initialize components
-transcriber = transcribe.WhisperTranscriber(model_name="base")
-nlp_processor = nlp.NLPProcessor()
-geo_locator = GeoLocator()
+DB_PATH = os.environ.get('DB_PATH', os.path.join('static', 'pdscanner.db'))
+HISTORY_DEFAULT_LIMIT = int(os.environ.get('HISTORY_DEFAULT_LIMIT', 5000))
+HISTORY_MAX_LIMIT = int(os.environ.get('HISTORY_MAX_LIMIT', 50000))
+HISTORY_STREAM_MAX_LIMIT = int(os.environ.get('HISTORY_STREAM_MAX_LIMIT', 1000000))
+# With ?zoom= at or below this level, history is returned as grid clusters
+# instead of individual events
+HISTORY_CLUSTER_MAX_ZOOM = int(os.environ.get('HISTORY_CLUSTER_MAX_ZOOM', 12))
+# Uploads larger than UPLOAD_STREAM_MIN_BYTES, or sent chunked, are decoded
+# and transcribed window by window while the body is still arriving
+UPLOAD_STREAM_MIN_BYTES = int(os.environ.get('UPLOAD_STREAM_MIN_BYTES', 8 * 1024 * 1024))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 1024 * 1024 * 1024))
+UPLOAD_MAX_SECONDS = float(os.environ.get('UPLOAD_MAX_SECONDS', 4 * 3600))
+UPLOAD_WINDOW = float(os.environ.get('UPLOAD_WINDOW', 30))
+UPLOAD_OVERLAP = float(os.environ.get('UPLOAD_OVERLAP', 5))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Print a stage timing trace for every request, not only those asking with ?trace=1
+TRACE_LOG = os.environ.get('TRACE_LOG', '0') == '1'
 
-# Set up PyAudio
-CHUNK = 1024
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
-RATE = 44100
-RECORD_SECONDS = 5
-WAVE_OUTPUT_FILENAME = "output.wav"
+# Inference pool sizing; each worker holds its own Whisper model
+WHISPER_MODEL = os.environ.get('WHISPER_MODEL', 'base')
+WHISPER_PROFILE = os.environ.get('WHISPER_PROFILE', 'default')
+WHISPER_LANGUAGE = os.environ.get('WHISPER_LANGUAGE')
+WHISPER_WORKERS = int(os.environ.get('WHISPER_WORKERS', default_workers()))
+WHISPER_QUEUE_SIZE = int(os.environ.get('WHISPER_QUEUE_SIZE', WHISPER_WORKERS * 4))
+WHISPER_QUEUE_TIMEOUT = float(os.environ.get('WHISPER_QUEUE_TIMEOUT', 30))
+WHISPER_BATCH = int(os.environ.get('WHISPER_BATCH', 1))
+WHISPER_THREADS = int(os.environ.get('WHISPER_THREADS', max(1, (os.cpu_count() or 1) // WHISPER_WORKERS)))
+
+# Initialize components; models load on first use (or at warm-up)
+transcriber = TranscriberPool(
+    lambda: transcribe.WhisperTranscriber(
+        model_name=WHISPER_MODEL,
+        num_threads=WHISPER_THREADS,
+        profile=WHISPER_PROFILE,
+        decode_options={'language': WHISPER_LANGUAGE} if WHISPER_LANGUAGE else None
+    ),
+    workers=WHISPER_WORKERS,
+    queue_size=WHISPER_QUEUE_SIZE,
+    queue_timeout=WHISPER_QUEUE_TIMEOUT,
+    max_batch=WHISPER_BATCH,
+    name="whisper"
+)
+nlp_processor = Lazy(lambda: nlp.NLPProcessor(
+    batch_size=int(os.environ.get('NLP_BATCH_SIZE', 64)),
+    n_process=int(os.environ.get('NLP_PROCESSES', 1))
+))
+db_pool = db.ConnectionPool(DB_PATH, size=int(os.environ.get('DB_POOL_SIZE', 8)))
+with db_pool.connection() as conn:
+    db.ensure_schema(conn)
+event_writer = db.EventWriter(db_pool)
+atexit.register(event_writer.close)
+
+geo_cache = GeoCache(
+    db_pool,
+    ttl=float(os.environ.get('GEOCODE_CACHE_TTL', 30 * 86400)),
+    negative_ttl=float(os.environ.get('GEOCODE_NEGATIVE_TTL', 86400))
+)
+GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH')
+gazetteer = Lazy(lambda: Gazetteer.load(GAZETTEER_PATH)) if GAZETTEER_PATH else None
+geo_locator = GeoLocator(
+    cache=geo_cache,
+    gazetteer=gazetteer,
+    offline=os.environ.get('GEOCODER_OFFLINE', '0') == '1',
+    rate_limiter=TokenBucket(
+        rate=float(os.environ.get('GEOCODE_RATE', 1.0)),
+        capacity=float(os.environ.get('GEOCODE_BURST', 1.0))
+    ),
+    workers=int(os.environ.get('GEOCODE_WORKERS', 4)),
+    base_url=os.environ.get('GEOCODE_URL', 'https://nominatim.openstreetmap.org/search')
+)
+result_cache = ResultCache(
+    db_pool,
+    max_bytes=int(os.environ.get('RESULT_CACHE_BYTES', 256 * 1024 * 1024))
+) if os.environ.get('RESULT_CACHE', '1') != '0' else None
+# Speech heard again within DEDUP_MAX_AGE seconds (simulcasts, repeated
+# tone-outs and announcements) reuses the earlier transcription
+dedup_index = audio.FingerprintIndex(
+    max_age=float(os.environ.get('DEDUP_MAX_AGE', 600))
+) if os.environ.get('DEDUP_ENABLED', '1') != '0' else None
+pipeline = Pipeline(
+    transcriber, nlp_processor, geo_locator,
+    vad=os.environ.get('VAD_ENABLED', '1') != '0',
+    cache=result_cache,
+    recorder=HistoryRecorder(event_writer) if os.environ.get('RECORD_HISTORY', '1') != '0' else None,
+    dedup=dedup_index,
+    config={
+        'model': WHISPER_MODEL,
+        'profile': WHISPER_PROFILE,
+        'language': WHISPER_LANGUAGE,
+        'batched': WHISPER_BATCH > 1,
+        'gazetteer': GAZETTEER_PATH,
+        'offline': geo_locator.offline,
+        'dedup': dedup_index is not None
+    }
+)
+jobs = JobManager(
+    workers=int(os.environ.get('JOB_WORKERS', 4)),
+    max_pending=int(os.environ.get('JOB_MAX_PENDING', 32))
+)
+scheduler = FeedScheduler(
+    pipeline,
+    workers=int(os.environ.get('FEED_WORKERS', WHISPER_WORKERS)),
+    max_backlog=int(os.environ.get('FEED_MAX_BACKLOG', 4)),
+    max_lag=float(os.environ.get('FEED_MAX_LAG', 120)),
+    denoise=os.environ.get('FEED_DENOISE', '1') != '0'
+)
+
+def _cache_requests():
+    geo = geo_cache.stats()
+    samples = [
+        (('geocode', 'hit_memory'), geo['memory_hits']),
+        (('geocode', 'hit_db'), geo['db_hits']),
+        (('geocode', 'miss'), geo['misses'])
+    ]
+    if result_cache is not None:
+        results = result_cache.stats()
+        samples += [(('results', 'hit'), results['hits']), (('results', 'miss'), results['misses'])]
+    if dedup_index is not None:
+        prints = dedup_index.stats()
+        samples += [(('fingerprint', 'hit'), prints['hits']),
+                    (('fingerprint', 'miss'), prints['lookups'] - prints['hits'])]
+    return samples
+
+metrics.registry.collected(
+    'pdscanner_cache_requests_total', 'Cache lookups by cache and result', 'counter',
+    ('cache', 'result'), _cache_requests
+)
+metrics.registry.collected(
+    'pdscanner_queue_depth', 'Work currently queued or running', 'gauge', ('queue',),
+    lambda: [
+        (('whisper',), transcriber.stats()['pending']),
+        (('feeds',), scheduler.stats()['backlog']),
+        (('db_write',), event_writer.stats()['queued'])
+    ]
+)
+metrics.registry.collected(
+    'pdscanner_models_loaded', 'Whisper models loaded by the worker pool', 'gauge', (),
+    lambda: [((), transcriber.loaded)]
+)
+metrics.registry.collected(
+    'pdscanner_events_total', 'History rows handled by the background writer', 'counter',
+    ('result',),
+    lambda: [(('written',), event_writer.written), (('dropped',), event_writer.dropped)]
+)
+metrics.registry.collected(
+    'pdscanner_feeds', 'Registered live feeds', 'gauge', (),
+    lambda: [((), scheduler.stats()['feeds'])]
+)
+
+def _trace_enabled():
+    return TRACE_LOG or request.args.get('trace') == '1' or request.headers.get('X-Trace') == '1'
+
+def _with_trace(response, trace, label):
+    """
+    Attach a finished trace to a response payload and log it if configured
+    """
+    if trace is None:
+        return response
+    data = trace.to_dict()
+    if TRACE_LOG:
+        print(f"Trace {label}: {json.dumps(data)}")
+    return dict(response, trace=data)
+
+def warmup():
+    """
+    Load every heavy component now instead of on the first request
+    """
+    started = time.time()
+    transcriber.warmup()
+    nlp_processor.get()
+    if gazetteer is not None:
+        gazetteer.get()
+    return time.time() - started
+
+if os.environ.get('WARMUP', '0') == '1':
+    threading.Thread(target=warmup, daemon=True).start()
+
+# Continuous capture from the server's microphone (or a replayed recording),
+# scheduled like any other feed; only one capture runs at a time
+CAPTURE_RATE = int(os.environ.get('CAPTURE_RATE', 16000))
+CAPTURE_WINDOW = float(os.environ.get('CAPTURE_WINDOW', 30))
+CAPTURE_OVERLAP = float(os.environ.get('CAPTURE_OVERLAP', 5))
+# How long /capture/stop waits for windows already captured to be transcribed
+CAPTURE_STOP_TIMEOUT = float(os.environ.get('CAPTURE_STOP_TIMEOUT', 60))
+capture_lock = threading.Lock()
+capture_feed = None
 
 
 @app.route("/", methods=["GET"])
 def retrieve():
     return render_template('layout2.html')
 
+def _streams_upload():
+    # Bodies of unknown or large size are decoded while they arrive; small
+    # ones keep the buffered path and its result cache
+    length = request.content_length
+    return length is None or length > UPLOAD_STREAM_MIN_BYTES
+
+def _transcribe_streamed():
+    if request.content_length and request.content_length > UPLOAD_MAX_BYTES:
+        return jsonify({'error': f'Upload is larger than {UPLOAD_MAX_BYTES} bytes'}), 413
+
+    stream = request.stream
+    if request.mimetype == 'multipart/form-data':
+        chunks = MultipartFile(stream, request.mimetype_params.get('boundary', '').encode(),
+                               'audio', UPLOAD_CHUNK_SIZE)
+        if chunks.filename is None:
+            return jsonify({'error': 'No audio file provided'}), 400
+        if not chunks.filename:
+            return jsonify({'error': 'No selected file'}), 400
+        filename = chunks.filename
+    else:
+        # Raw body, e.g. curl -T recording.mp3 /transcribe?filename=recording.mp3
+        chunks = iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b'')
+        filename = request.args.get('filename', 'stream')
+
+    source = f'upload:{filename}'
+    ingester = UploadIngester(chunks, UPLOAD_WINDOW, UPLOAD_OVERLAP,
+                              max_bytes=UPLOAD_MAX_BYTES, max_seconds=UPLOAD_MAX_SECONDS)
+    with metrics.trace(_trace_enabled()) as trace:
+        ingester.start()
+        try:
+            response = pipeline.run_windows(ingester.windows(), source=source)
+        finally:
+            ingester.stop()
+            ingester.join()
+
+    if ingester.rejected:
+        return jsonify({'error': ingester.error}), 413
+    if ingester.failed:
+        # Never pass off the part decoded before the failure as the whole upload
+        return jsonify({'error': f'Failed to decode audio: {ingester.error}'}), 400
+    if ingester.buffer.total == 0:
+        return jsonify({'error': 'Failed to decode audio'}), 400
+    if response is None:
+        return jsonify({'error': 'Transcription failed'}), 500
+    return jsonify(_with_trace(response, trace, source))
+
 @app.route("/transcribe", methods=["POST"])
 def transcribe_audio():
     try:
+        if _streams_upload():
+            return _transcribe_streamed()
+
         if 'audio' not in request.files:
             return jsonify({'error': 'No audio file provided'}), 400
         
@@ -45,52 +279,23 @@ def transcribe_audio():
         if not file.filename:
             return jsonify({'error': 'No selected file'}), 400
 
-        temp_path = os.path.join('static', 'temp_audio.wav')
-        file.save(temp_path)
-        
-        # Reduce noise
-        reduced_noise_audio, sr = audio.reduce_noise(temp_path)
-        if reduced_noise_audio is not None:
-            soundfile.write(temp_path, reduced_noise_audio, sr)
-        
-        # Transcribe
-        transcription = transcriber.transcribe_audio_with_timestamps(temp_path)
-        if not transcription:
-            return jsonify({'error': 'Transcription failed'}), 500
-        
-        # Extract entities using NLP processor
-        entities = nlp_processor.extract_entities(transcription['full_text'])
-        
-        # Get locations using new GeoLocator
-        try:
-            locations = geo_locator.locate_entities(entities)
-        except Exception as e:
-            print(f"Geocoding error: {str(e)}")
-            locations = []
-        
-        # Clean up
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        with metrics.trace(_trace_enabled()) as trace:
+            # Decode once, straight to Whisper's 16 kHz mono float32
+            with metrics.timed('convert'):
+                samples = audio.decode_audio(file.read())
+            if samples is None:
+                return jsonify({'error': 'Failed to decode audio'}), 400
+            if len(samples) > UPLOAD_MAX_SECONDS * audio.WHISPER_SAMPLE_RATE:
+                return jsonify({'error': f'Audio is longer than {UPLOAD_MAX_SECONDS:g} seconds'}), 413
             
-        # Format the response
-        response = {
-            'transcription': {
-                'full_text': transcription['full_text'],
-              'segments': [
-                    {
-                        'text': seg['text'],
-                       'start': seg['start'],
-                        'end': seg['end']
-                    } for seg in transcription['segments']
-                ],
-                'language': transcription['language']
-            },
-            'entities': entities,
-            'locations': locations
-        }
+            response = pipeline.run(samples, source=f'upload:{file.filename}')
+        if response is None:
+            return jsonify({'error': 'Transcription failed'}), 500
         
-        return jsonify(response)
+        return jsonify(_with_trace(response, trace, f'upload:{file.filename}'))
         
+    except PoolBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         print(f"Transcription error: {str(e)}")
         return jsonify({'error': f'Processing failed: {str(e)}'}), 500
@@ -102,128 +307,283 @@ def process_stream():
         stream_url = data.get('stream_url')
         if not stream_url:
             return jsonify({'error': 'No stream URL provided'}), 400
-            
-        temp_mp3 = os.path.join('static', 'temp_audio.mp3')
-        temp_wav = os.path.join('static', 'temp_audio.wav')
         
-        # Fetch and process audio
-        if not audio.fetch_audio(stream_url, temp_mp3):
-            return jsonify({'error': 'Failed to fetch audio'}), 500
-            
-        if not audio.convert_mp3_to_wav(temp_mp3, temp_wav):
-            return jsonify({'error': 'Failed to convert audio'}), 500
+        with metrics.trace(_trace_enabled()) as trace:
+            # Fetch and decode audio in memory
+            with metrics.timed('fetch'):
+                encoded = audio.fetch_audio_bytes(stream_url)
+            if encoded is None:
+                return jsonify({'error': 'Failed to fetch audio'}), 500
+                
+            with metrics.timed('convert'):
+                samples = audio.decode_audio(encoded)
+            if samples is None:
+                return jsonify({'error': 'Failed to convert audio'}), 500
             
-        # Reduce noise
-        reduced_noise_audio, sr = audio.reduce_noise(temp_wav)
-        if reduced_noise_audio is not None:
-            soundfile.write(temp_wav, reduced_noise_audio, sr)
-        
-        # Transcribe
-        transcription = transcriber.transcribe_audio_with_timestamps(temp_wav)
-        if not transcription:
+            response = pipeline.run(samples, source=stream_url)
+        if response is None:
             return jsonify({'error': 'Transcription failed'}), 500
         
-        # Extract entities and locations using new processors
-        entities = nlp_processor.extract_entities(transcription['full_text'])
-        locations = geo_locator.locate_entities(entities)
-        
-        # Clean up
-        for temp_file in [temp_mp3, temp_wav]:
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
-                
-        # Format the response
-        response = {
-            'transcription': {
-                'full_text': transcription['full_text'],
-             'segments': [
-                    {
-                        'text': seg['text'],
-                       'start': seg['start'],
-                        'end': seg['end']
-                    } for seg in transcription['segments']
-                ],
-                'language': transcription['language']
-            },
-            'entities': entities,
-            'locations': locations
-        }
-        
-        return jsonify(response)
+        return jsonify(_with_trace(response, trace, stream_url))
         
+    except PoolBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         print(f"Stream processing error: {str(e)}")
         return jsonify({'error': f'Processing failed: {str(e)}'}), 500
 
-@app.route("/record_audio_from_mic", methods=["GET"])
-def record_audio_from_mic():
+def _run_stream_job(job, stream_url, traced=False):
+    with metrics.trace(traced) as trace:
+        job.emit('status', {'status': 'fetching'})
+        with metrics.timed('fetch'):
+            encoded = audio.fetch_audio_bytes(stream_url)
+        if encoded is None:
+            job.error = 'Failed to fetch audio'
+            return None
+        response = _run_audio_job(job, encoded, stream_url)
+    return _with_trace(response, trace, stream_url) if response else response
+
+def _run_audio_job(job, encoded, source, traced=False):
+    with metrics.trace(traced) as trace:
+        job.emit('status', {'status': 'decoding'})
+        with metrics.timed('convert'):
+            samples = audio.decode_audio(encoded)
+        if samples is None:
+            job.error = 'Failed to decode audio'
+            return None
+        job.emit('status', {'status': 'transcribing'})
+        response = pipeline.run(samples, on_stage=job.emit, source=source)
+    if response is None:
+        job.error = 'Transcription failed'
+        return None
+    return _with_trace(response, trace, source)
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    try:
+        if request.content_length and request.content_length > UPLOAD_MAX_BYTES:
+            return jsonify({'error': f'Upload is larger than {UPLOAD_MAX_BYTES} bytes'}), 413
+        if 'audio' in request.files:
+            file = request.files['audio']
+            if not file.filename:
+                return jsonify({'error': 'No selected file'}), 400
+            encoded = file.read()
+            source = f'upload:{file.filename}'
+            traced = _trace_enabled()
+            job = jobs.submit('transcribe', lambda job: _run_audio_job(job, encoded, source, traced))
+        else:
+            data = request.get_json(silent=True) or {}
+            stream_url = data.get('stream_url')
+            if not stream_url:
+                return jsonify({'error': 'No stream URL or audio file provided'}), 400
+            traced = _trace_enabled()
+            job = jobs.submit('stream', lambda job: _run_stream_job(job, stream_url, traced))
+
+        return jsonify({
+            'job_id': job.id,
+            'status_url': f'/jobs/{job.id}',
+            'events_url': f'/jobs/{job.id}/events'
+        }), 202
+
+    except JobQueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        print(f"Job submission error: {str(e)}")
+        return jsonify({'error': f'Failed to submit job: {str(e)}'}), 500
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return Response(
+        sse_stream(job, request.headers.get('Last-Event-ID')),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route("/feeds", methods=["POST"])
+def register_feed():
     try:
-        # Start the audio recording
-        threading.Thread(target=record_audio).start()
-        return jsonify({'message': 'Recording started'})
+        data = request.get_json(silent=True) or {}
+        stream_url = data.get('stream_url')
+        if not stream_url:
+            return jsonify({'error': 'No stream URL provided'}), 400
+
+        feed = scheduler.register(
+            stream_url,
+            name=data.get('name'),
+            window=float(data.get('window', 30)),
+            overlap=float(data.get('overlap', 5))
+        )
+        return jsonify(feed.status()), 201
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"Error starting recording: {str(e)}")
-        return jsonify({'error': f'Failed to start recording: {str(e)}'}), 500
+        print(f"Feed registration error: {str(e)}")
+        return jsonify({'error': f'Failed to register feed: {str(e)}'}), 500
 
+@app.route("/feeds", methods=["GET"])
+def list_feeds():
+    return jsonify(scheduler=scheduler.stats(), feeds=[feed.status() for feed in scheduler.feeds()])
 
-@app.route("/record_audio", methods=["POST"])
-def record_audio():
+@app.route("/feeds/<feed_id>", methods=["GET"])
+def feed_results(feed_id):
+    feed = scheduler.get(feed_id)
+    if feed is None:
+        return jsonify({'error': 'Unknown feed'}), 404
+    since = request.args.get('since', 0, type=int)
+    return jsonify(status=feed.status(), results=scheduler.results_since(feed, since))
+
+@app.route("/feeds/<feed_id>", methods=["DELETE"])
+def unregister_feed(feed_id):
+    feed = scheduler.unregister(feed_id)
+    if feed is None:
+        return jsonify({'error': 'Unknown feed'}), 404
+    return jsonify(feed.status())
+
+def _capture_status():
+    feed = capture_feed
+    if feed is None:
+        return {'capturing': False}
+    status = feed.status()
+    status['capture'] = feed.ingester.status()
+    status['capturing'] = status['running']
+    # Windows captured before the source finished may still be transcribing
+    status['pending'] = feed.running and (feed.busy or bool(feed.chunks))
+    status['results_url'] = f'/feeds/{feed.id}'
+    return status
+
+@app.route("/capture/start", methods=["POST"])
+def start_capture():
+    global capture_feed
     try:
-        # Open the microphone
-        p = pyaudio.PyAudio()
-        stream = p.open(format=FORMAT,
-                        channels=CHANNELS,
-                        rate=RATE,
-                        input=True,
-                        frames_per_buffer=CHUNK)
-
-        print("Recording...")
-        frames = []
-        chunk_counter = 0
-
-        while True:
-            data = stream.read(CHUNK)
-            frames.append(data)
-
-            # Process the audio chunk every 30 seconds
-            if len(frames) >= CHUNK_SIZE * RATE / CHUNK:
-                chunk_counter += 1
-                chunk = b"".join(frames)
-                frames = []
-
-                # Save the chunk to a temporary file
-                temp_path = os.path.join('static', f'temp_audio_{chunk_counter}.wav')
-                wf = wave.open(temp_path, 'wb')
-                wf.setnchannels(CHANNELS)
-                wf.setsampwidth(p.get_sample_size(FORMAT))
-                wf.setframerate(RATE)
-                wf.writeframes(chunk)
-                wf.close()
-
-                # Transcribe the chunk
-                transcription = transcriber.transcribe_audio_with_timestamps(temp_path)
-
-                # Extract entities and locations
-                entities = nlp_processor.extract_entities(transcription['full_text'])
-                locations = geo_locator.locate_entities(entities)
-
-                # Update the dashboard
-                response = {
-                    'transcription': transcription,
-                    'entities': entities,
-                    'locations': locations
-                }
-                return jsonify(response)
+        if 'audio' in request.files:
+            # Replay an uploaded recording through the capture path instead of the mic
+            file = request.files['audio']
+            samples = audio.decode_audio(file.read())
+            if samples is None:
+                return jsonify({'error': 'Failed to decode audio'}), 400
+            source = ReplaySource(samples, name=file.filename,
+                                  speed=request.form.get('speed', 1.0, type=float))
+        else:
+            data = request.get_json(silent=True) or {}
+            source = MicrophoneSource(
+                device=data.get('device'),
+                rate=int(data.get('rate', CAPTURE_RATE)),
+                channels=int(data.get('channels', 1))
+            )
 
+        with capture_lock:
+            if capture_feed is not None:
+                if capture_feed.ingester.is_alive():
+                    return jsonify({'error': 'Capture already running'}), 409
+                scheduler.unregister(capture_feed.id)
+            capture_feed = scheduler.attach(
+                source.name,
+                lambda on_window, denoiser: CaptureIngester(
+                    source, on_window, CAPTURE_WINDOW, CAPTURE_OVERLAP, denoiser=denoiser
+                ),
+                name='capture'
+            )
+        return jsonify(_capture_status()), 202
     except Exception as e:
-        print(f"Error recording audio: {str(e)}")
-        return jsonify({'error': f'Failed to record audio: {str(e)}'}), 500
+        print(f"Error starting capture: {str(e)}")
+        return jsonify({'error': f'Failed to start capture: {str(e)}'}), 500
+
+@app.route("/capture/stop", methods=["POST"])
+def stop_capture():
+    global capture_feed
+    with capture_lock:
+        feed = capture_feed
+        if feed is None:
+            return jsonify({'error': 'No capture running'}), 404
+        scheduler.finish(feed.id, CAPTURE_STOP_TIMEOUT)
+        status = _capture_status()
+        capture_feed = None
+    return jsonify(status)
+
+@app.route("/capture/status", methods=["GET"])
+def capture_status():
+    return jsonify(_capture_status())
+
+def _parse_bbox(value):
+    # "min_lon,min_lat,max_lon,max_lat", as sent by Leaflet's toBBoxString()
+    if not value:
+        return None
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    return parts
+
+def _stream_history(start, end, bbox, limit, serializer):
+    # The pooled connection is held until the client has read the last row
+    with db_pool.connection() as conn:
+        rows = db.iter_events(conn, start, end, bbox=bbox, limit=limit)
+        yield from serializer(rows)
+
+def _history_response(body, output):
+    headers = {'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        body = geojson.gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    mimetype = 'application/geo+json' if output == 'geojson' else 'application/json'
+    return Response(body, mimetype=mimetype, headers=headers)
+
+def _cluster_history(output, zoom, bbox, limit):
+    # One row per grid cell in view, so the size is bounded by the viewport
+    with metrics.timed('db_query'), db_pool.connection() as conn:
+        rows = db.fetch_clusters(conn, request.args.get("start"), request.args.get("end"),
+                                 zoom, bbox=bbox, limit=limit)
+    if output == 'geojson':
+        return _history_response(
+            geojson.iter_feature_collection(rows, to_feature=geojson.cluster_feature), output
+        )
+    if output == 'compact':
+        return _history_response(
+            geojson.iter_compact(rows, columns=geojson.CLUSTER_COLUMNS), output
+        )
+    return jsonify(map_markers=[geojson.cluster_feature(row) for row in rows],
+                   clustered=True, truncated=len(rows) >= limit)
 
 @app.route("/sendRequest/history", methods=["GET"])
 def history():
     try:
-        conn = db.open_connection('static/pdscanner.db')
-        results = db.fetch_events(conn, request.args.get("start"), request.args.get("end"))
+        output = request.args.get("format")
+        if output not in (None, 'geojson', 'compact'):
+            return jsonify({'error': 'format must be geojson or compact'}), 400
+        max_limit = HISTORY_MAX_LIMIT if output is None else HISTORY_STREAM_MAX_LIMIT
+        try:
+            bbox = _parse_bbox(request.args.get("bbox"))
+            limit = min(request.args.get("limit", HISTORY_DEFAULT_LIMIT, type=int), max_limit)
+            zoom = request.args.get("zoom")
+            if zoom is not None and not zoom.isdigit():
+                raise ValueError("zoom must be a non-negative integer")
+            zoom = int(zoom) if zoom is not None else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if zoom is not None and zoom <= HISTORY_CLUSTER_MAX_ZOOM:
+            return _cluster_history(output, zoom, bbox, limit)
+
+        if output is not None:
+            # Streamed: rows go from the cursor to the socket without a full list
+            serializer = geojson.iter_feature_collection if output == 'geojson' else geojson.iter_compact
+            body = _stream_history(request.args.get("start"), request.args.get("end"),
+                                   bbox, limit, serializer)
+            return _history_response(body, output)
+
+        with metrics.timed('db_query'), db_pool.connection() as conn:
+            results = db.fetch_events(conn, request.args.get("start"), request.args.get("end"),
+                                      bbox=bbox, limit=limit)
         historical_markers = [
             {
                 'geometry': {'type': 'Point', 'coordinates': [row[1], row[2]]},
@@ -231,11 +591,66 @@ def history():
             }
             for row in results
         ]
-        return jsonify(map_markers=historical_markers)
+        return jsonify(map_markers=historical_markers, truncated=len(historical_markers) >= limit)
     except Exception as e:
         print(f"History retrieval error: {str(e)}")
         return jsonify({'error': f'Failed to retrieve history: {str(e)}'}), 500
 
+@app.route("/search", methods=["GET"])
+def search():
+    try:
+        text = request.args.get("q", "").strip()
+        if not text:
+            return jsonify({'error': 'No search query provided'}), 400
+        limit = min(request.args.get("limit", 50, type=int), 500)
+
+        with metrics.timed('db_query'), db_pool.connection() as conn:
+            rows = db.search_transcripts(conn, text, request.args.get("start"),
+                                         request.args.get("end"), limit)
+        results = [
+            {
+                'snippet': row[0],
+                'text': row[1],
+                'source': row[2],
+                'date': row[3],
+                'timestamp': row[4]
+            }
+            for row in rows
+        ]
+        return jsonify(results=results)
+    except Exception as e:
+        print(f"Search error: {str(e)}")
+        return jsonify({'error': f'Search failed: {str(e)}'}), 500
+
+@app.route("/warmup", methods=["POST"])
+def warmup_endpoint():
+    try:
+        seconds = warmup()
+        return jsonify({'status': 'ready', 'seconds': round(seconds, 3), 'workers': transcriber.stats()})
+    except Exception as e:
+        print(f"Warm-up error: {str(e)}")
+        return jsonify({'error': f'Warm-up failed: {str(e)}'}), 500
+
+@app.route("/stats/geocode", methods=["GET"])
+def geocode_stats():
+    return jsonify(geo_cache.stats())
+
+@app.route("/stats/dedup", methods=["GET"])
+def dedup_stats():
+    if dedup_index is None:
+        return jsonify({'enabled': False})
+    return jsonify(dedup_index.stats())
+
+@app.route("/stats/results", methods=["GET"])
+def result_cache_stats():
+    if result_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(result_cache.stats())
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == "__main__":
     # Ensure static directory exists
     os.makedirs('static', exist_ok=True)
@@ -0,0 +1,74 @@
+"""
+Local stand-in for the Nominatim search API
+
+Answers every query with a deterministic point derived from the place
+name after a fixed delay, so geocoding cost can be measured without the
+network or the public service's rate limit.
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class FakeGeocoder:
+    def __init__(self, latency: float = 0.05, host: str = '127.0.0.1', port: int = 0):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        geocoder = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+                with geocoder._lock:
+                    geocoder.requests += 1
+                time.sleep(geocoder.latency)
+                body = json.dumps(geocoder.lookup(query)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @staticmethod
+    def lookup(query: str) -> list:
+        if not query or query.lower().startswith('nowhere'):
+            return []
+        digest = hashlib.sha256(query.lower().encode()).digest()
+        lat = 25.0 + digest[0] / 255 * 23.0
+        lon = -124.0 + digest[1] / 255 * 57.0
+        return [{
+            'lat': f'{lat:.6f}',
+            'lon': f'{lon:.6f}',
+            'display_name': query,
+            'type': 'city',
+            'importance': 0.3 + digest[2] / 255 * 0.6
+        }]
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/search'
+
+    def start(self) -> 'FakeGeocoder':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeGeocoder':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
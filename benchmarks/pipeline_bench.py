@@ -0,0 +1,401 @@
+"""
+Benchmark each processing stage and the /transcribe endpoint end to end
+
+Usage:
+    python benchmarks/pipeline_bench.py [--lengths 10,30,120] [--snr 20,10,5]
+        [--repeat 5] [--clients 1,4,8] [--model tiny] [--stub-models]
+        [--geocode-latency 0.05] [--output results.json]
+        [--compare baseline.json] [--tolerance 0.15]
+
+Audio is generated by synthetic.py from fixed seeds and geocoding goes to
+a local FakeGeocoder, so runs are repeatable and need no network. Stages
+whose dependencies are missing (ffmpeg, Whisper, spaCy) are reported as
+skipped. --stub-models swaps Whisper and spaCy for scripted stand-ins in
+the end-to-end run; the stand-ins still run inside the transcriber pool,
+so the run measures everything around the models, queueing included.
+
+For every stage and clip the report gives latency percentiles, the real
+time factor (audio seconds per processing second) and how far RSS rose
+above its level at the start of the runs; the end-to-end run adds
+throughput for each number of concurrent clients.
+With --compare, latencies, real time factors and throughputs that moved
+the wrong way by more than --tolerance are listed and the exit status
+is 1.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from fake_geocoder import FakeGeocoder
+from synthetic import SCRIPT, SR, places_in, scanner_audio, to_wav_bytes, transcript
+from modules import audio
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+class RssSampler:
+    def __init__(self, interval: float = 0.005):
+        """
+        Track how far RSS rises above its starting level inside a with block
+
+        Current RSS is polled from /proc on a background thread. Where /proc
+        is missing the growth of ru_maxrss is used instead, which reads 0
+        for a stage that stays below an earlier stage's peak.
+        """
+        self.interval = interval
+        self.delta_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss_mb()
+            if rss is not None:
+                self._peak = max(self._peak, rss)
+
+    def __enter__(self):
+        self._baseline = current_rss_mb()
+        if self._baseline is None:
+            self._baseline = peak_rss_mb()
+        else:
+            self._peak = self._baseline
+            self._thread = threading.Thread(target=self._poll, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is None:
+            self.delta_mb = round(peak_rss_mb() - self._baseline, 1)
+            return False
+        self._stop.set()
+        self._thread.join()
+        self._peak = max(self._peak, current_rss_mb() or 0.0)
+        self.delta_mb = round(self._peak - self._baseline, 1)
+        return False
+
+def summarize(latencies, audio_seconds=None):
+    values = np.asarray(latencies, dtype=np.float64)
+    summary = {
+        'n': int(len(values)),
+        'mean': round(float(values.mean()), 5),
+        'p50': round(float(np.percentile(values, 50)), 5),
+        'p90': round(float(np.percentile(values, 90)), 5),
+        'p99': round(float(np.percentile(values, 99)), 5),
+        'max': round(float(values.max()), 5)
+    }
+    if audio_seconds:
+        summary['real_time_factor'] = round(audio_seconds / max(summary['mean'], 1e-9), 3)
+    return summary
+
+def timed_runs(fn, repeat):
+    fn()  # Warm-up run, not counted
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def make_clips(lengths, snrs):
+    clips = []
+    for seed, (seconds, snr) in enumerate((s, n) for s in lengths for n in snrs):
+        samples, spurts = scanner_audio(seconds, snr, seed=seed)
+        clips.append({
+            'key': f'{seconds:g}s_{snr:g}dB',
+            'seconds': seconds,
+            'samples': samples,
+            'wav': to_wav_bytes(samples),
+            'segments': transcript(spurts, seed=seed)
+        })
+    return clips
+
+class ScriptedTranscriber:
+    def __init__(self, cost: float):
+        """
+        Whisper stand-in: returns script lines and spends cost seconds
+        per audio second so queueing still behaves realistically
+        """
+        self.cost = cost
+
+    def transcribe_batch(self, clips):
+        return [self.transcribe_audio_with_timestamps(samples) for samples in clips]
+
+    def transcribe_audio_with_timestamps(self, samples):
+        duration = len(samples) / SR
+        time.sleep(duration * self.cost)
+        segments = [
+            {'text': SCRIPT[i % len(SCRIPT)][0], 'start': float(start), 'end': float(min(start + 3.0, duration))}
+            for i, start in enumerate(np.arange(0.0, duration, 3.0))
+        ]
+        return {
+            'full_text': ' '.join(seg['text'] for seg in segments),
+            'segments': segments,
+            'language': 'en'
+        }
+
+class ScriptedNLP:
+    def extract_entities_batch(self, segments):
+        return places_in(segments)
+
+def stage_benchmarks(args, clips, geocoder):
+    stages = {}
+
+    def run(name, fn_for_clip, available=True, reason=None):
+        if not available:
+            stages[name] = {'skipped': reason}
+            return
+        stages[name] = {}
+        for clip in clips:
+            with RssSampler() as rss:
+                latencies = timed_runs(lambda: fn_for_clip(clip), args.repeat)
+            stages[name][clip['key']] = summarize(latencies, clip['seconds'])
+            stages[name][clip['key']]['rss_delta_mb'] = rss.delta_mb
+        print(f"  {name}: done", file=sys.stderr)
+
+    run('decode', lambda clip: audio.decode_audio(clip['wav']),
+        shutil.which('ffmpeg') is not None, 'ffmpeg not found')
+    run('vad', lambda clip: audio.detect_speech(clip['samples']))
+    run('denoise', lambda clip: audio.denoise(clip['samples']))
+
+    def stream_denoise(clip):
+        denoiser = audio.SpectralDenoiser()
+        block = SR // 10
+        for start in range(0, len(clip['samples']), block):
+            denoiser.process(clip['samples'][start:start + block])
+        denoiser.flush()
+    run('denoise_stream', stream_denoise)
+    run('fingerprint', lambda clip: audio.fingerprint(clip['samples']))
+
+    transcriber = None
+    reason = None
+    try:
+        from modules.transcribe import WhisperTranscriber
+        transcriber = WhisperTranscriber(model_name=args.model, num_threads=args.threads,
+                                         profile=args.profile)
+    except Exception as e:
+        reason = f'Whisper unavailable: {str(e)}'
+    run('transcribe', lambda clip: transcriber.transcribe_audio_with_timestamps(clip['samples']),
+        transcriber is not None, reason)
+
+    processor = None
+    reason = None
+    try:
+        from modules.nlp import NLPProcessor
+        processor = NLPProcessor()
+        processor.extract_entities_batch([{'text': 'warm up', 'start': 0.0, 'end': 1.0}])
+    except Exception as e:
+        processor = None
+        reason = f'spaCy unavailable: {str(e)}'
+    run('ner', lambda clip: processor.extract_entities_batch(clip['segments']),
+        processor is not None, reason)
+
+    from modules.geo import GeoLocator, TokenBucket
+    from modules.geocache import GeoCache
+
+    def geocode(clip):
+        # A fresh memory-only cache each run measures the remote path
+        locator = GeoLocator(cache=GeoCache(), rate_limiter=TokenBucket(1000, 1000),
+                             base_url=geocoder.url)
+        try:
+            locator.locate_entities(places_in(clip['segments']))
+        finally:
+            locator.close()
+    run('geocode', geocode)
+    return stages
+
+def end_to_end(args, clips, geocoder):
+    if shutil.which('ffmpeg') is None:
+        return {'skipped': 'ffmpeg not found'}
+
+    workdir = tempfile.mkdtemp(prefix='pdscanner-bench-')
+    os.environ.update({
+        'DB_PATH': os.path.join(workdir, 'bench.db'),
+        'GEOCODE_URL': geocoder.url,
+        'GEOCODE_RATE': '1000',
+        'GEOCODE_BURST': '1000',
+        'RESULT_CACHE': '0',
+        'DEDUP_ENABLED': '0',
+        'WARMUP': '0',
+        'WHISPER_MODEL': args.model,
+        'WHISPER_PROFILE': args.profile
+    })
+    os.chdir(ROOT)
+    import app as webapp
+
+    if args.stub_models:
+        # Swap the factory, not the pool, so clients still queue for workers
+        webapp.transcriber.factory = lambda: ScriptedTranscriber(args.stub_cost)
+        webapp.pipeline.nlp_processor = ScriptedNLP()
+
+    # Warm-up request so model loading is not timed
+    webapp.app.test_client().post('/transcribe', data={
+        'audio': (io.BytesIO(clips[0]['wav']), 'warmup.wav')
+    }, content_type='multipart/form-data')
+
+    results = {'stubbed_models': args.stub_models}
+    for clients in args.clients:
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def client(index):
+            test_client = webapp.app.test_client()
+            for i in range(args.repeat):
+                clip = clips[(index + i) % len(clips)]
+                start = time.perf_counter()
+                response = test_client.post('/transcribe', data={
+                    'audio': (io.BytesIO(clip['wav']), f"{clip['key']}.wav")
+                }, content_type='multipart/form-data')
+                elapsed = time.perf_counter() - start
+                with lock:
+                    if response.status_code == 200:
+                        latencies.append((elapsed, clip['seconds']))
+                    else:
+                        errors.append(response.status_code)
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+        with RssSampler() as rss:
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - start
+
+        entry = {'errors': len(errors), 'wall_seconds': round(wall, 3)}
+        if latencies:
+            audio_seconds = sum(seconds for _, seconds in latencies)
+            entry.update(summarize([elapsed for elapsed, _ in latencies]))
+            entry['throughput_rps'] = round(len(latencies) / wall, 3)
+            entry['throughput_audio_x'] = round(audio_seconds / wall, 3)
+        entry['rss_delta_mb'] = rss.delta_mb
+        results[str(clients)] = entry
+        print(f"  end_to_end x{clients}: done", file=sys.stderr)
+
+    webapp.event_writer.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def _flatten(tree, prefix=''):
+    flat = {}
+    for key, value in tree.items():
+        path = f'{prefix}/{key}' if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+def compare(current, baseline, tolerance):
+    """
+    List metrics that got worse by more than tolerance
+    """
+    lower_better = ('/p50', '/p90', '/p99', '/mean')
+    higher_better = ('/real_time_factor', '/throughput_rps', '/throughput_audio_x')
+    now, before = _flatten(current['results']), _flatten(baseline['results'])
+    regressions = []
+    for path, old in before.items():
+        new = now.get(path)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        if (path.endswith(lower_better) and change > tolerance) or \
+                (path.endswith(higher_better) and change < -tolerance):
+            regressions.append({'metric': path, 'baseline': old, 'current': new,
+                                'change': round(change, 3)})
+    return regressions
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lengths', default='10,30,120')
+    parser.add_argument('--snr', default='20,10,5')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--clients', default='1,4')
+    parser.add_argument('--model', default='tiny')
+    parser.add_argument('--profile', default='default')
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--stub-models', action='store_true')
+    parser.add_argument('--stub-cost', type=float, default=0.05)
+    parser.add_argument('--geocode-latency', type=float, default=0.05)
+    parser.add_argument('--skip-stages', action='store_true')
+    parser.add_argument('--skip-end-to-end', action='store_true')
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+    args.clients = [int(c) for c in args.clients.split(',')]
+
+    lengths = [float(x) for x in args.lengths.split(',')]
+    snrs = [float(x) for x in args.snr.split(',')]
+    print("Generating audio", file=sys.stderr)
+    clips = make_clips(lengths, snrs)
+
+    report = {
+        'meta': {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'numpy': np.__version__,
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+        },
+        'results': {}
+    }
+    with FakeGeocoder(latency=args.geocode_latency) as geocoder:
+        if not args.skip_stages:
+            print("Stages", file=sys.stderr)
+            report['results']['stages'] = stage_benchmarks(args, clips, geocoder)
+        if not args.skip_end_to_end:
+            print("End to end", file=sys.stderr)
+            report['results']['end_to_end'] = end_to_end(args, clips, geocoder)
+        report['meta']['geocoder_requests'] = geocoder.requests
+    report['meta']['peak_rss_mb'] = peak_rss_mb()
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report['regressions'] = regressions
+        status = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+    sys.exit(status)
+
+if __name__ == '__main__':
+    main()
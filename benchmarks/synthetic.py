@@ -0,0 +1,145 @@
+"""
+Deterministic scanner-like test audio and dispatch transcripts
+
+The audio is not intelligible speech: it is a voiced, formant-shaped
+signal in talk spurts, band-limited like a radio channel, with key-up
+clicks, squelch tails and background noise at a chosen SNR. That is
+enough to exercise decoding, VAD, denoising and Whisper's compute cost
+without shipping recordings.
+"""
+import io
+import wave
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+SR = 16000
+
+# Dispatch-style lines and the places in them, used wherever a stage
+# needs text instead of audio (NER, geocoding, stubbed transcription)
+SCRIPT: List[Tuple[str, List[str]]] = [
+    ("Engine 5 respond to a structure fire at Oak Street and Main Street in Springfield",
+     ["Oak Street", "Main Street", "Springfield"]),
+    ("Medic 12 en route to Riverside Park for a fall with injury",
+     ["Riverside Park"]),
+    ("Units be advised the suspect vehicle was last seen heading north toward Shelbyville",
+     ["Shelbyville"]),
+    ("Traffic collision blocking two lanes on Highway 9 near Capital City",
+     ["Highway 9", "Capital City"]),
+    ("Ladder 3 clear of the alarm at Lakeview Mall returning to quarters",
+     ["Lakeview Mall"]),
+    ("Caller reports smoke from a brush fire west of Ogdenville along the river",
+     ["Ogdenville"]),
+    ("Welfare check requested at Elm Avenue in North Haverbrook",
+     ["Elm Avenue", "North Haverbrook"]),
+    ("Dispatch copies all units clear, no further traffic",
+     []),
+]
+
+def _talk_spurts(rng: np.random.Generator, n: int, sr: int) -> List[Tuple[int, int]]:
+    spurts = []
+    pos = int(rng.uniform(0.3, 1.0) * sr)
+    while pos < n:
+        length = int(rng.uniform(1.5, 4.5) * sr)
+        spurts.append((pos, min(pos + length, n)))
+        pos += length + int(rng.uniform(0.8, 3.0) * sr)
+    return spurts
+
+def _band_limit(x: np.ndarray, sr: int, low: float = 300.0, high: float = 3400.0,
+                shape=None) -> np.ndarray:
+    spectrum = np.fft.rfft(x)
+    freqs = np.fft.rfftfreq(len(x), 1.0 / sr)
+    gain = ((freqs >= low) & (freqs <= high)).astype(np.float64)
+    if shape is not None:
+        gain *= shape(freqs)
+    return np.fft.irfft(spectrum * gain, len(x))
+
+def _formants(freqs: np.ndarray) -> np.ndarray:
+    # Average vowel envelope: three broad resonances
+    peaks = ((500.0, 150.0, 1.0), (1500.0, 250.0, 0.6), (2500.0, 300.0, 0.35))
+    return 0.05 + sum(a * np.exp(-0.5 * ((freqs - f) / w) ** 2) for f, w, a in peaks)
+
+def scanner_audio(seconds: float, snr_db: float = 10.0, seed: int = 0,
+                  sr: int = SR) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """
+    Generate one channel of scanner-like audio
+
+    Returns:
+        tuple: (float32 samples, list of (start, end) talk spurts)
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    spurts = _talk_spurts(rng, n, sr)
+
+    # Glottal source: harmonics of a slowly wandering pitch
+    f0 = rng.uniform(100, 170) + 15 * np.sin(2 * np.pi * 0.6 * t + rng.uniform(0, 6.28))
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    source = np.zeros(n)
+    for k in range(1, 35):
+        source += np.where(k * f0 < 3800, np.sin(k * phase) / k, 0.0)
+
+    # Syllable rhythm inside each talk spurt
+    syllables = (0.5 * (1 + np.sin(2 * np.pi * 4.5 * t + rng.uniform(0, 6.28)))) ** 2
+    talking = np.zeros(n)
+    for start, end in spurts:
+        talking[start:end] = 1.0
+    voice = _band_limit(source, sr, shape=_formants) * syllables * talking
+    speech_rms = np.sqrt(np.mean(voice[talking > 0] ** 2)) if talking.any() else 1.0
+    voice *= 0.1 / max(speech_rms, 1e-9)
+
+    noise = _band_limit(rng.standard_normal(n), sr, 200.0, 4000.0)
+    noise *= 0.1 / (10 ** (snr_db / 20)) / max(noise.std(), 1e-9)
+
+    # Key-up click and a louder squelch tail around each transmission
+    for start, end in spurts:
+        noise[start:start + 40] += rng.uniform(-0.3, 0.3, len(noise[start:start + 40]))
+        tail = noise[end:end + int(0.15 * sr)]
+        tail *= 4.0
+
+    samples = np.clip(voice + noise, -1.0, 1.0).astype(np.float32)
+    return samples, spurts
+
+def to_wav_bytes(samples: np.ndarray, sr: int = SR) -> bytes:
+    """
+    Encode float32 samples as 16-bit mono WAV
+    """
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sr)
+        wf.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes())
+    return buf.getvalue()
+
+def transcript(spurts: List[Tuple[int, int]], seed: int = 0, sr: int = SR) -> List[Dict]:
+    """
+    Script lines laid over the talk spurts, one line per spurt
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(SCRIPT))
+    return [
+        {
+            'text': SCRIPT[order[i % len(SCRIPT)]][0],
+            'start': start / sr,
+            'end': end / sr
+        }
+        for i, (start, end) in enumerate(spurts)
+    ]
+
+def places_in(segments: List[Dict]) -> List[Dict]:
+    """
+    Entities for the script lines in segments, shaped like NLPProcessor output
+    """
+    lookup = dict(SCRIPT)
+    entities = []
+    for index, seg in enumerate(segments):
+        for place in lookup.get(seg['text'], []):
+            entities.append({
+                'entity': place,
+                'type': 'GPE',
+                'segment': index,
+                'start': seg['start'],
+                'end': seg['end']
+            })
+    return entities
@@ -0,0 +1,127 @@
+"""
+Compare Whisper CPU inference profiles on speed and word error rate
+
+Usage:
+    python benchmarks/whisper_profiles.py clip1.wav clip2.mp3 ... \
+        [--references refs.txt] [--model base] [--threads 4] [--repeat 3] [--batch]
+
+With --batch the clips are also transcribed together through
+transcribe_batch and reported as an extra "<profile>+batch" row.
+
+refs.txt holds one reference transcript per line, in the same order as
+the clips. Without references only speed is reported.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import audio, transcribe
+
+def _words(text):
+    return ''.join(c if c.isalnum() or c.isspace() else ' ' for c in text.lower()).split()
+
+def word_error_rate(reference, hypothesis):
+    """
+    Word-level edit distance divided by the reference length
+    """
+    ref, hyp = _words(reference), _words(hypothesis)
+    if not ref:
+        return float(bool(hyp))
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i]
+        for j, h in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1] / len(ref)
+
+def run_profile(profile, clips, references, model_name, threads, repeat, language, batch=False):
+    load_start = time.perf_counter()
+    transcriber = transcribe.WhisperTranscriber(
+        model_name=model_name,
+        num_threads=threads,
+        profile=profile,
+        decode_options={'language': language} if language else None
+    )
+    load_time = time.perf_counter() - load_start
+
+    audio_seconds = 0.0
+    elapsed = 0.0
+    errors = []
+    for index, samples in enumerate(clips):
+        audio_seconds += len(samples) / audio.WHISPER_SAMPLE_RATE * repeat
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = transcriber.transcribe_audio_with_timestamps(samples)
+            elapsed += time.perf_counter() - start
+        if references and result is not None:
+            errors.append(word_error_rate(references[index], result['full_text']))
+    rows = [_row(profile, load_time, audio_seconds, elapsed, errors)]
+
+    if batch:
+        elapsed = 0.0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = transcriber.transcribe_batch(clips)
+            elapsed += time.perf_counter() - start
+        errors = [
+            word_error_rate(reference, result['full_text'])
+            for reference, result in zip(references or [], results) if result is not None
+        ]
+        rows.append(_row(profile + '+batch', load_time, audio_seconds, elapsed, errors))
+    return rows
+
+def _row(profile, load_time, audio_seconds, elapsed, errors):
+    return {
+        'profile': profile,
+        'load_seconds': round(load_time, 3),
+        'audio_seconds': round(audio_seconds, 3),
+        'elapsed_seconds': round(elapsed, 3),
+        'real_time_factor': round(audio_seconds / elapsed, 3) if elapsed else None,
+        'wer': round(sum(errors) / len(errors), 4) if errors else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('clips', nargs='+')
+    parser.add_argument('--references')
+    parser.add_argument('--model', default='base')
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--language')
+    parser.add_argument('--batch', action='store_true')
+    parser.add_argument('--profiles', default=','.join(transcribe.PROFILES))
+    args = parser.parse_args()
+
+    clips = []
+    for path in args.clips:
+        with open(path, 'rb') as f:
+            samples = audio.decode_audio(f.read())
+        if samples is None:
+            parser.error(f"Could not decode {path}")
+        clips.append(samples)
+
+    references = None
+    if args.references:
+        with open(args.references) as f:
+            references = [line.strip() for line in f]
+        if len(references) != len(clips):
+            parser.error("Need one reference line per clip")
+
+    results = [
+        row
+        for profile in args.profiles.split(',')
+        for row in run_profile(profile, clips, references, args.model, args.threads,
+                               args.repeat, args.language, args.batch)
+    ]
+    baseline = results[0]['elapsed_seconds']
+    for result in results:
+        result['speedup'] = round(baseline / result['elapsed_seconds'], 2) if result['elapsed_seconds'] else None
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,15 @@
 import sqlite3
+from modules import db, geocache, resultcache
 
 def create_tables(db_path='pdscanner.db'):
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
 
-    # Create events table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS events (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        longitude REAL,
-        latitude REAL,
-        title TEXT,
-        description TEXT,
-        date TEXT
-    )
-    ''')
+    # Create events table with its date and spatial indexes
+    db.ensure_schema(conn)
+
+    # Cache tables are owned by the modules that use them
+    geocache.ensure_schema(conn)
+    resultcache.ensure_schema(conn)
 
     conn.commit()
     conn.close()
@@ -1,40 +1,215 @@
-import pydub
 import requests
 import time
-import librosa # type: ignore
-import soundfile # type: ignore
-import noisereduce as nr # type: ignore
 import numpy as np
+import subprocess
+import threading
 import wave
-from typing import Tuple, Optional
+from typing import Any, Callable, Dict, List, Tuple, Optional
 
-def fetch_audio(stream_url: str, output_path: str, max_time: int = 15) -> bool:
+# Whisper models expect 16 kHz mono float32 input
+WHISPER_SAMPLE_RATE = 16000
+
+def fetch_audio_bytes(stream_url: str, max_time: int = 15) -> Optional[bytes]:
     """
-    Fetch audio from a stream URL with timeout.
+    Fetch audio from a stream URL into memory with timeout.
     
     Args:
         stream_url (str): URL of the audio stream
-        output_path (str): Path to save the audio file
         max_time (int): Maximum time to spend downloading in seconds
         
     Returns:
-        bool: True if successful, False otherwise
+        bytes: Encoded audio data, or None if failed
     """
     try:
         start_time = time.time()
-        r = requests.get(stream_url, stream=True)
+        r = requests.get(stream_url, stream=True, timeout=10)
         r.raise_for_status()  # Raise exception for bad status codes
         
-        with open(output_path, 'wb') as f:
-            for block in r.iter_content(1024):
-                f.write(block)
-                if (time.time() - start_time) > max_time:
-                    break
-        return True
+        buffer = bytearray()
+        for block in r.iter_content(16384):
+            buffer.extend(block)
+            if (time.time() - start_time) > max_time:
+                break
+        r.close()
+        return bytes(buffer)
         
     except Exception as e:
         print(f"Error fetching audio: {str(e)}")
+        return None
+
+def fetch_audio(stream_url: str, output_path: str, max_time: int = 15) -> bool:
+    """
+    Fetch audio from a stream URL with timeout.
+    
+    Args:
+        stream_url (str): URL of the audio stream
+        output_path (str): Path to save the audio file
+        max_time (int): Maximum time to spend downloading in seconds
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    data = fetch_audio_bytes(stream_url, max_time)
+    if data is None:
         return False
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    return True
+
+def decode_audio(data: bytes, sr: int = WHISPER_SAMPLE_RATE) -> Optional[np.ndarray]:
+    """
+    Decode an encoded audio buffer (MP3, WAV, WebM, ...) in a single pass.
+    
+    ffmpeg reads the buffer from stdin and downmixes and resamples in the
+    same step, so the result can be handed straight to Whisper.
+    
+    Args:
+        data (bytes): Encoded audio data
+        sr (int): Target sample rate
+        
+    Returns:
+        np.ndarray: Mono float32 samples in [-1, 1], or None if failed
+    """
+    try:
+        proc = subprocess.run(_ffmpeg_pcm_command(sr), input=data, capture_output=True, check=True)
+        return np.frombuffer(proc.stdout, np.int16).astype(np.float32) / 32768.0
+        
+    except Exception as e:
+        print(f"Error decoding audio: {str(e)}")
+        return None
+
+def _ffmpeg_pcm_command(sr: int) -> list:
+    # Read any container from stdin, write 16-bit mono PCM at sr to stdout
+    return [
+        'ffmpeg', '-loglevel', 'error', '-threads', '0',
+        '-i', 'pipe:0',
+        '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(sr),
+        'pipe:1'
+    ]
+
+class StreamDecoder:
+    def __init__(self, on_samples: Callable[[np.ndarray], None], sr: int = WHISPER_SAMPLE_RATE):
+        """
+        Incremental decoder for encoded audio that arrives in pieces
+
+        Bytes passed to feed() go to a long-lived ffmpeg process; a reader
+        thread hands decoded mono float32 samples to on_samples as soon as
+        ffmpeg emits them.
+        """
+        self.sr = sr
+        self.on_samples = on_samples
+        self._proc = subprocess.Popen(
+            _ffmpeg_pcm_command(sr),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        remainder = b''
+        while True:
+            block = self._proc.stdout.read1(8192)
+            if not block:
+                break
+            block = remainder + block
+            usable = len(block) - (len(block) % 2)
+            remainder = block[usable:]
+            if usable:
+                samples = np.frombuffer(block[:usable], np.int16).astype(np.float32) / 32768.0
+                self.on_samples(samples)
+
+    def feed(self, data: bytes) -> bool:
+        """
+        Pass encoded bytes to the decoder
+
+        Returns:
+            bool: False if the decoder process has gone away
+        """
+        try:
+            self._proc.stdin.write(data)
+            self._proc.stdin.flush()
+            return True
+        except (BrokenPipeError, ValueError, OSError):
+            return False
+
+    def close(self, timeout: Optional[float] = 5.0,
+              abort: Optional[threading.Event] = None) -> None:
+        """
+        Flush remaining audio through ffmpeg and wait for the reader
+
+        With timeout=None every decoded sample reaches on_samples however
+        long it blocks. ffmpeg is killed, dropping what it still holds, once
+        timeout passes or as soon as abort is set.
+        """
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._reader.is_alive() and not (abort is not None and abort.is_set()):
+            wait = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+            if wait <= 0:
+                break
+            self._reader.join(wait)
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+
+    @property
+    def finished(self) -> bool:
+        # True once the reader has handed over its last samples
+        return not self._reader.is_alive()
+
+class RingBuffer:
+    def __init__(self, capacity: int):
+        """
+        Fixed-size float32 sample buffer addressed by absolute sample index
+
+        Writes overwrite the oldest samples once capacity is reached; total
+        counts every sample ever written so readers can track positions.
+        """
+        self.capacity = capacity
+        self.total = 0
+        self._data = np.zeros(capacity, dtype=np.float32)
+        self._lock = threading.Lock()
+
+    @property
+    def oldest(self) -> int:
+        return max(0, self.total - self.capacity)
+
+    def write(self, samples: np.ndarray) -> None:
+        with self._lock:
+            n = len(samples)
+            if n >= self.capacity:
+                samples = samples[-self.capacity:]
+                self.total += n - self.capacity
+                n = self.capacity
+            pos = self.total % self.capacity
+            first = min(n, self.capacity - pos)
+            self._data[pos:pos + first] = samples[:first]
+            self._data[:n - first] = samples[first:]
+            self.total += n
+
+    def read(self, start: int, end: int) -> Optional[np.ndarray]:
+        """
+        Copy samples [start, end) by absolute index
+
+        Returns:
+            np.ndarray: The samples, or None if the range was overwritten
+            or has not been written yet
+        """
+        with self._lock:
+            if start < self.oldest or end > self.total or start > end:
+                return None
+            pos = start % self.capacity
+            n = end - start
+            first = min(n, self.capacity - pos)
+            out = np.empty(n, dtype=np.float32)
+            out[:first] = self._data[pos:pos + first]
+            out[first:] = self._data[:n - first]
+            return out
 
 def convert_mp3_to_wav(mp3_path: str, wav_path: str) -> bool:
     """
@@ -48,6 +223,7 @@ def convert_mp3_to_wav(mp3_path: str, wav_path: str) -> bool:
         bool: True if successful, False otherwise
     """
     try:
+        import pydub
         sound = pydub.AudioSegment.from_mp3(mp3_path)
         sound.export(wav_path, format="wav")
         return True
@@ -56,9 +232,545 @@ def convert_mp3_to_wav(mp3_path: str, wav_path: str) -> bool:
         print(f"Error converting MP3 to WAV: {str(e)}")
         return False
 
+def denoise(samples: np.ndarray, sr: int = WHISPER_SAMPLE_RATE) -> np.ndarray:
+    """
+    Reduce stationary noise in decoded samples.
+    
+    The noise profile is estimated from the quietest frames of the
+    samples themselves; use a SpectralDenoiser directly to reuse one.
+    
+    Args:
+        samples (np.ndarray): Mono float32 samples
+        sr (int): Sample rate of the samples
+        
+    Returns:
+        np.ndarray: Denoised float32 samples, or the input if denoising failed
+    """
+    try:
+        return SpectralDenoiser(sr).apply(samples)
+        
+    except Exception as e:
+        print(f"Error reducing noise: {str(e)}")
+        return samples
+
+class SpectralDenoiser:
+    def __init__(self, sr: int = WHISPER_SAMPLE_RATE, n_fft: int = 512, hop: int = 128,
+                 prop_decrease: float = 0.75, n_std: float = 1.5, smooth_bins: int = 5,
+                 adapt: float = 0.05, update_db: float = 6.0, stale_seconds: float = 10.0):
+        """
+        Stationary spectral gate with a cached noise profile
+        
+        The profile is the per-frequency mean and spread, in dB, of frames
+        that look like noise. STFT bins less than n_std spreads above the
+        mean are attenuated by prop_decrease, with the mask smoothed over
+        smooth_bins neighbouring frequencies.
+        
+        apply() denoises a whole clip. process() denoises a stream chunk
+        by chunk with overlap-add, carrying its frame tail between calls,
+        so a feed can keep one instance for its lifetime; its output lags
+        the input by latency seconds. While streaming the profile follows
+        frames within update_db of the noise floor, and is measured again
+        from the quietest frames if none arrive for stale_seconds.
+        """
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop = hop
+        self.prop_decrease = prop_decrease
+        self.n_std = n_std
+        self.smooth_bins = smooth_bins
+        self.adapt = adapt
+        self.update_db = update_db
+        self.stale_frames = int(stale_seconds * sr / hop)
+        # Periodic Hann for both analysis and synthesis; norm undoes the
+        # summed squared windows of overlapping frames
+        self.window = np.hanning(n_fft + 1)[:-1].astype(np.float32)
+        self.norm = float((self.window ** 2).sum() / hop)
+        self.noise_mean: Optional[np.ndarray] = None
+        self.noise_std: Optional[np.ndarray] = None
+        self.noise_level = 0.0
+        self.updates = 0
+        self._stale = 0
+        self._tail = np.zeros(n_fft - hop, dtype=np.float32)
+        self._pending = np.zeros(n_fft - hop, dtype=np.float32)
+
+    @property
+    def latency(self) -> float:
+        return (self.n_fft - self.hop) / self.sr
+
+    @property
+    def has_profile(self) -> bool:
+        return self.noise_mean is not None
+
+    def _frames(self, buf: np.ndarray) -> np.ndarray:
+        if len(buf) < self.n_fft:
+            return np.zeros((0, self.n_fft), dtype=np.float32)
+        return np.lib.stride_tricks.sliding_window_view(buf, self.n_fft)[::self.hop]
+
+    def _spectrum_db(self, spec: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Per-bin dB and per-frame mean power in dB
+        power = spec.real ** 2 + spec.imag ** 2
+        return 10.0 * np.log10(power + 1e-12), 10.0 * np.log10(power.mean(axis=1) + 1e-12)
+
+    def _set_profile(self, db: np.ndarray, level: np.ndarray, weight: float = 1.0) -> None:
+        mean, std, floor = db.mean(axis=0), db.std(axis=0), float(level.mean())
+        if self.noise_mean is None or weight >= 1.0:
+            self.noise_mean, self.noise_std, self.noise_level = mean, std, floor
+        else:
+            self.noise_mean += weight * (mean - self.noise_mean)
+            self.noise_std += weight * (std - self.noise_std)
+            self.noise_level += weight * (floor - self.noise_level)
+        self.updates += 1
+
+    def _quietest(self, level: np.ndarray) -> np.ndarray:
+        return level <= np.percentile(level, 20)
+
+    def estimate(self, samples: np.ndarray,
+                 regions: Optional[List[Tuple[int, int]]] = None) -> bool:
+        """
+        Replace the noise profile with one measured on samples
+        
+        Args:
+            samples (np.ndarray): Mono float32 samples
+            regions (list): Optional (start, end) speech ranges, e.g. from
+                detect_speech, to leave out; otherwise the quietest fifth
+                of the frames is used
+        
+        Returns:
+            bool: False if samples were too short to measure
+        """
+        frames = self._frames(np.asarray(samples, dtype=np.float32))
+        if len(frames) < 4:
+            return False
+        db, level = self._spectrum_db(np.fft.rfft(frames * self.window, axis=1))
+
+        noise = self._quietest(level)
+        if regions:
+            starts = np.arange(len(frames)) * self.hop
+            speech = np.zeros(len(frames), dtype=bool)
+            for start, end in regions:
+                speech |= (starts + self.n_fft > start) & (starts < end)
+            if (~speech).sum() >= 4:
+                noise = ~speech
+
+        self._set_profile(db[noise], level[noise])
+        self._stale = 0
+        return True
+
+    def _smooth(self, mask: np.ndarray) -> np.ndarray:
+        # Moving average over neighbouring frequency bins via cumulative sums,
+        # never below the mask itself so kept bins stay at full gain
+        k = self.smooth_bins
+        if k <= 1:
+            return mask
+        padded = np.pad(mask, ((0, 0), (k // 2, k - 1 - k // 2)), mode='edge')
+        c = np.cumsum(padded, axis=1)
+        c = np.concatenate((np.zeros((len(mask), 1), dtype=c.dtype), c), axis=1)
+        return np.maximum(mask, (c[:, k:] - c[:, :-k]) / k)
+
+    def _adapt(self, db: np.ndarray, level: np.ndarray) -> None:
+        noise = level <= self.noise_level + self.update_db
+        if noise.any():
+            weight = 1.0 - (1.0 - self.adapt) ** int(noise.sum())
+            self._set_profile(db[noise], level[noise], weight)
+            self._stale = 0
+            return
+        self._stale += len(level)
+        if self._stale >= self.stale_frames and len(level) >= 8:
+            # The floor has moved up; start again from this chunk
+            quiet = self._quietest(level)
+            self._set_profile(db[quiet], level[quiet])
+            self._stale = 0
+
+    def _overlap_add(self, buf: np.ndarray, pending: np.ndarray,
+                     track: bool) -> Tuple[np.ndarray, np.ndarray, int]:
+        # Denoise every full frame of buf; returns the finished output, the
+        # overlap still waiting for later frames and the samples consumed
+        frames = self._frames(buf)
+        n = len(frames)
+        if n == 0:
+            return np.zeros(0, dtype=np.float32), pending, 0
+
+        spec = np.fft.rfft(frames * self.window, axis=1)
+        db, level = self._spectrum_db(spec)
+        if track:
+            if self.noise_mean is None:
+                if n >= 8:
+                    quiet = self._quietest(level)
+                    self._set_profile(db[quiet], level[quiet])
+            else:
+                self._adapt(db, level)
+
+        if self.noise_mean is not None:
+            mask = (db > self.noise_mean + self.n_std * self.noise_std).astype(np.float32)
+            spec = spec * (1.0 - self.prop_decrease * (1.0 - self._smooth(mask)))
+        out = np.fft.irfft(spec, self.n_fft, axis=1).astype(np.float32) * self.window
+
+        # n_fft is a whole number of hops: add each hop-sized block of every
+        # frame into the accumulator, one block offset at a time
+        blocks = self.n_fft // self.hop
+        acc = np.zeros((n + blocks - 1, self.hop), dtype=np.float32)
+        out = out.reshape(n, blocks, self.hop)
+        for r in range(blocks):
+            acc[r:r + n] += out[:, r]
+        acc = acc.reshape(-1)
+        acc[:len(pending)] += pending
+
+        consumed = n * self.hop
+        return acc[:consumed] / self.norm, acc[consumed:], consumed
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """
+        Denoise the next chunk of a stream
+        
+        Returns:
+            np.ndarray: As many output samples as whole hops are complete,
+            delayed by latency; call flush() at the end of the stream
+        """
+        buf = np.concatenate((self._tail, np.asarray(chunk, dtype=np.float32)))
+        out, self._pending, consumed = self._overlap_add(buf, self._pending, track=True)
+        self._tail = buf[consumed:]
+        return out
+
+    def flush(self) -> np.ndarray:
+        """
+        Return the output still held back and reset the stream state
+        """
+        pad = self.n_fft - len(self._tail) % self.hop if len(self._tail) % self.hop else self.n_fft - self.hop
+        out = self.process(np.zeros(pad, dtype=np.float32))
+        self._tail = np.zeros(self.n_fft - self.hop, dtype=np.float32)
+        self._pending = np.zeros(self.n_fft - self.hop, dtype=np.float32)
+        return out
+
+    def apply(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Denoise a whole clip, estimating a profile from it if none is cached
+        
+        Leaves the streaming state untouched; the output is aligned with
+        the input and the same length.
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if self.noise_mean is None and not self.estimate(samples):
+            return samples
+        edge = self.n_fft - self.hop
+        extra = -len(samples) % self.hop
+        buf = np.concatenate((
+            np.zeros(edge, dtype=np.float32),
+            samples,
+            np.zeros(edge + extra, dtype=np.float32)
+        ))
+        out, _, _ = self._overlap_add(buf, np.zeros(edge, dtype=np.float32), track=False)
+        return out[edge:edge + len(samples)]
+
+def _frame_energy_db(samples: np.ndarray, frame_len: int, sr: int,
+                     band: Tuple[float, float]) -> np.ndarray:
+    # Per-frame energy inside the speech band, in dB, for non-overlapping frames
+    n_frames = len(samples) // frame_len
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame_len), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(frame_len, 1.0 / sr)
+    in_band = (freqs >= band[0]) & (freqs <= band[1])
+    energy = spectrum[:, in_band].sum(axis=1) / frame_len
+    return 10.0 * np.log10(energy + 1e-12)
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    # (start, end) frame indices of each run of True values
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.stack((np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)), axis=1)
+
+def noise_floor_db(samples: np.ndarray, sr: int = WHISPER_SAMPLE_RATE, frame_ms: int = 30,
+                   band: Tuple[float, float] = (300.0, 3400.0)) -> Optional[float]:
+    """
+    Noise floor of a clip as detect_speech measures it (10th percentile
+    band energy), for tracking a long-term floor across windows
+    """
+    frame_len = int(sr * frame_ms / 1000)
+    if len(samples) < frame_len:
+        return None
+    return float(np.percentile(_frame_energy_db(samples, frame_len, sr, band), 10))
+
+def detect_speech(samples: np.ndarray, sr: int = WHISPER_SAMPLE_RATE,
+                  frame_ms: int = 30, margin_db: float = 9.0,
+                  floor_db: float = -60.0, min_speech: float = 0.25,
+                  min_silence: float = 0.6, padding: float = 0.2,
+                  band: Tuple[float, float] = (300.0, 3400.0),
+                  min_spread_db: float = 6.0,
+                  noise_floor: Optional[float] = None) -> List[Tuple[int, int]]:
+    """
+    Find speech regions with a vectorized band-energy detector.
+    
+    Frames whose 300-3400 Hz energy is margin_db above the clip's noise
+    floor (its 10th percentile frame energy) count as speech, provided
+    that is still margin_db below its loudest frames. Gaps shorter
+    than min_silence are bridged, bursts shorter than min_speech (clicks,
+    squelch tails) are dropped and each region is padded on both sides.
+    
+    A clip whose loud frames (95th percentile) are less than
+    min_spread_db above its noise floor is steady noise and has no
+    speech. A longer-term noise_floor, e.g. tracked per feed with
+    noise_floor_db, also bounds the threshold from below.
+    
+    Args:
+        samples (np.ndarray): Mono float32 samples
+        sr (int): Sample rate of the samples
+        noise_floor (float): Optional noise floor from earlier audio
+        
+    Returns:
+        list: (start, end) sample indices of speech regions
+    """
+    frame_len = int(sr * frame_ms / 1000)
+    if len(samples) < frame_len:
+        return []
+
+    energy = _frame_energy_db(samples, frame_len, sr, band)
+    noise, loud = np.percentile(energy, [10, 95])
+    if loud - noise < min_spread_db:
+        return []
+    # Stay below the loud frames too, so a clip that is speech throughout
+    # is not mistaken for its own noise floor
+    threshold = max(min(noise + margin_db, loud - margin_db), floor_db)
+    if noise_floor is not None:
+        threshold = max(threshold, noise_floor + margin_db)
+    mask = energy > threshold
+
+    frame_sec = frame_len / sr
+    gaps = _runs(~mask)
+    for start, end in gaps:
+        if 0 < start and end < len(mask) and (end - start) * frame_sec < min_silence:
+            mask[start:end] = True
+
+    regions = []
+    pad = int(padding * sr)
+    for start, end in _runs(mask):
+        if (end - start) * frame_sec < min_speech:
+            continue
+        begin = max(0, int(start) * frame_len - pad)
+        finish = min(len(samples), int(end) * frame_len + pad)
+        if regions and begin <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], finish)
+        else:
+            regions.append((begin, finish))
+    return regions
+
+class SpeechMap:
+    def __init__(self, regions: List[Tuple[int, int]], total: int,
+                 sr: int = WHISPER_SAMPLE_RATE, gap: float = 0.1):
+        """
+        Layout of speech regions once silence is cut out
+
+        Regions are packed back to back with gap seconds of silence between
+        them so Whisper still hears a break; the map converts times on the
+        packed timeline back to the original one.
+        """
+        self.regions = regions
+        self.total = total
+        self.sr = sr
+        self.gap_samples = int(gap * sr)
+        lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        self._packed_starts = np.concatenate(([0], np.cumsum(lengths + self.gap_samples)[:-1])) \
+            if len(regions) else np.zeros(0, dtype=np.int64)
+        self._lengths = lengths
+
+    @property
+    def speech_seconds(self) -> float:
+        return float(self._lengths.sum()) / self.sr
+
+    @property
+    def skipped_seconds(self) -> float:
+        return self.total / self.sr - self.speech_seconds
+
+    def extract(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Concatenate the speech regions of samples
+        """
+        gap = np.zeros(self.gap_samples, dtype=np.float32)
+        parts = []
+        for i, (start, end) in enumerate(self.regions):
+            if i:
+                parts.append(gap)
+            parts.append(samples[start:end])
+        if not parts:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate(parts).astype(np.float32, copy=False)
+
+    def to_original(self, t: float) -> float:
+        """
+        Map a time on the packed timeline to the original timeline
+        """
+        if not self.regions:
+            return t
+        pos = t * self.sr
+        i = max(0, int(np.searchsorted(self._packed_starts, pos, side='right')) - 1)
+        offset = min(max(pos - self._packed_starts[i], 0), self._lengths[i])
+        return float(self.regions[i][0] + offset) / self.sr
+
+    def remap_segments(self, segments: List[Dict]) -> List[Dict]:
+        return [
+            dict(seg, start=self.to_original(seg['start']), end=self.to_original(seg['end']))
+            for seg in segments
+        ]
+
+    def summary(self) -> Dict:
+        return {
+            'speech_seconds': round(self.speech_seconds, 3),
+            'skipped_seconds': round(self.skipped_seconds, 3),
+            'regions': [
+                [round(start / self.sr, 3), round(end / self.sr, 3)]
+                for start, end in self.regions
+            ]
+        }
+
+# Frame step of fingerprint(); match offsets are in these frames
+FINGERPRINT_HOP = 256
+
+def fingerprint(samples: np.ndarray, sr: int = WHISPER_SAMPLE_RATE, n_fft: int = 1024,
+                hop: int = FINGERPRINT_HOP, band: Tuple[float, float] = (300.0, 3400.0),
+                neighborhood: Tuple[int, int] = (8, 12), fan_out: int = 6,
+                max_dt: int = 63) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Landmark fingerprint of a stretch of audio
+
+    Spectral peaks that are the maximum of their (frames, bins)
+    neighborhood are paired with the next fan_out peaks up to max_dt
+    frames later; each pair hashes its two frequencies and time gap. The
+    hashes survive channel noise and level changes, and their anchor
+    frames let a match be aligned across different cut points.
+
+    Returns:
+        tuple: (int64 hashes, int32 anchor frames), sorted by frame
+    """
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32))
+    if len(samples) < n_fft:
+        return empty
+    frames = np.lib.stride_tricks.sliding_window_view(samples.astype(np.float32, copy=False), n_fft)[::hop]
+    low = int(band[0] * n_fft / sr)
+    high = min(int(band[1] * n_fft / sr), n_fft // 2)
+    spectrum = np.log(np.abs(np.fft.rfft(frames * np.hanning(n_fft).astype(np.float32), axis=1))[:, low:high] + 1e-6)
+
+    # Separable max filter: over time, then over frequency
+    dt, df = neighborhood
+    padded = np.pad(spectrum, ((dt, dt), (0, 0)), mode='constant', constant_values=-np.inf)
+    local = np.lib.stride_tricks.sliding_window_view(padded, 2 * dt + 1, axis=0).max(axis=-1)
+    padded = np.pad(local, ((0, 0), (df, df)), mode='constant', constant_values=-np.inf)
+    local = np.lib.stride_tricks.sliding_window_view(padded, 2 * df + 1, axis=1).max(axis=-1)
+    floor = np.median(spectrum, axis=1, keepdims=True) + 1.0
+    times, bins = np.nonzero((spectrum == local) & (spectrum > floor))
+    if len(times) < 2:
+        return empty
+
+    hashes, anchors = [], []
+    for k in range(1, fan_out + 1):
+        gap = times[k:] - times[:-k]
+        valid = (gap > 0) & (gap <= max_dt)
+        hashes.append((bins[:-k][valid].astype(np.int64) << 14) | (bins[k:][valid].astype(np.int64) << 6) | gap[valid])
+        anchors.append(times[:-k][valid])
+    hashes = np.concatenate(hashes)
+    anchors = np.concatenate(anchors).astype(np.int32)
+    order = np.argsort(anchors, kind='stable')
+    return hashes[order], anchors[order]
+
+class FingerprintIndex:
+    def __init__(self, max_age: float = 600.0, min_matches: int = 12, min_score: float = 0.2,
+                 max_entries: int = 5000, duration_tolerance: float = 0.2):
+        """
+        Recently heard audio, looked up by landmark fingerprint
+
+        Entries are (fingerprint, duration, value) and expire after
+        max_age seconds or once max_entries are held. A lookup matches
+        the entry with most hashes agreeing on one time offset, if at
+        least min_matches and min_score of the query's hashes agree and
+        the durations are within duration_tolerance of each other.
+        """
+        self.max_age = max_age
+        self.min_matches = min_matches
+        self.min_score = min_score
+        self.max_entries = max_entries
+        self.duration_tolerance = duration_tolerance
+        self.lookups = 0
+        self.hits = 0
+        self.seconds_reused = 0.0
+        self._postings: Dict[int, List[Tuple[int, int]]] = {}
+        self._entries: Dict[int, Tuple[float, float, np.ndarray, Any]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        # Caller holds self._lock; entries are in insertion order
+        while self._entries:
+            entry_id, (created, _, hashes, _) = next(iter(self._entries.items()))
+            if now - created < self.max_age and len(self._entries) < self.max_entries:
+                break
+            del self._entries[entry_id]
+            for h in np.unique(hashes).tolist():
+                postings = [p for p in self._postings.get(h, ()) if p[0] != entry_id]
+                if postings:
+                    self._postings[h] = postings
+                else:
+                    self._postings.pop(h, None)
+
+    def add(self, prints: Tuple[np.ndarray, np.ndarray], duration: float, value: Any) -> None:
+        hashes, anchors = prints
+        if len(hashes) < self.min_matches:
+            return
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (now, duration, hashes, value)
+            for h, t in zip(hashes.tolist(), anchors.tolist()):
+                self._postings.setdefault(h, []).append((entry_id, t))
+
+    def match(self, prints: Tuple[np.ndarray, np.ndarray],
+              duration: float) -> Optional[Tuple[Any, int]]:
+        """
+        Find a recent entry that sounds the same
+
+        Returns:
+            tuple: (value, offset) where the query's frame t lines up with
+                the entry's frame t + offset, or None
+        """
+        hashes, anchors = prints
+        with self._lock:
+            self.lookups += 1
+            self._expire(time.time())
+            if len(hashes) < self.min_matches:
+                return None
+            ids, offsets = [], []
+            for h, t in zip(hashes.tolist(), anchors.tolist()):
+                for entry_id, entry_t in self._postings.get(h, ()):
+                    ids.append(entry_id)
+                    offsets.append(entry_t - t)
+            if not ids:
+                return None
+            # Vote on (entry, offset); a real match piles up on one offset
+            pairs, votes = np.unique(np.stack([ids, offsets], axis=1), axis=0, return_counts=True)
+            best = int(np.argmax(votes))
+            entry_id, offset = (int(v) for v in pairs[best])
+            _, entry_duration, _, value = self._entries[entry_id]
+            if votes[best] < max(self.min_matches, self.min_score * len(hashes)):
+                return None
+            if abs(entry_duration - duration) > self.duration_tolerance * max(entry_duration, duration):
+                return None
+            self.hits += 1
+            self.seconds_reused += duration
+            return value, offset
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+                'seconds_reused': round(self.seconds_reused, 3),
+                'entries': len(self._entries)
+            }
+
 def reduce_noise(audio_path: str) -> Tuple[Optional[np.ndarray], Optional[int]]:
     """
-    Reduce noise in audio file using noisereduce.
+    Reduce noise in audio file.
+    
+    The file is downmixed and resampled to 16 kHz while decoding, so the
+    denoiser never works on samples Whisper would discard.
     
     Args:
         audio_path (str): Path to audio file
@@ -67,18 +779,12 @@ def reduce_noise(audio_path: str) -> Tuple[Optional[np.ndarray], Optional[int]]:
         tuple: (reduced_noise_audio, sample_rate) or (None, None) if failed
     """
     try:
-        # Load audio file using librosa
-        audio, sr = librosa.load(audio_path, sr=None)
-        
-        # Perform noise reduction
-        reduced_noise_audio = nr.reduce_noise(
-            y=audio, 
-            sr=sr,
-            stationary=True,
-            prop_decrease=0.75
-        )
+        with open(audio_path, 'rb') as f:
+            samples = decode_audio(f.read())
+        if samples is None:
+            return None, None
         
-        return reduced_noise_audio, sr
+        return denoise(samples, WHISPER_SAMPLE_RATE), WHISPER_SAMPLE_RATE
         
     except Exception as e:
         print(f"Error reducing noise: {str(e)}")
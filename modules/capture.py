@@ -0,0 +1,253 @@
+import threading
+import time
+import wave
+from typing import Callable, Dict, Optional, Union
+
+import numpy as np
+
+from modules import audio
+from modules.ingest import WindowedIngester
+
+def _to_mono_float(data: bytes, channels: int) -> np.ndarray:
+    samples = np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples
+
+def _resample(samples: np.ndarray, rate: int, target: int) -> np.ndarray:
+    # Linear interpolation is plenty for speech headed to a 16 kHz model
+    if rate == target or not len(samples):
+        return samples
+    n = int(round(len(samples) * target / rate))
+    positions = np.arange(n) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+class StreamResampler:
+    def __init__(self, rate: int, target: int):
+        """
+        Linear resampler for audio that arrives in blocks
+
+        The output position and the last input sample carry over between
+        blocks, so block lengths never round and block edges interpolate
+        as if the input had been one array.
+        """
+        self.step = rate / target
+        self._pos = 0.0
+        self._last: Optional[np.float32] = None
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        if self.step == 1.0 or not len(samples):
+            return samples
+        # Positions count input samples from the start of this block; the
+        # previous block's last sample sits at -1
+        if self._last is None:
+            source, base = samples, 0
+        else:
+            source, base = np.concatenate(([self._last], samples)), -1
+        last = len(samples) - 1
+        n = int(np.floor((last - self._pos) / self.step)) + 1 if self._pos <= last else 0
+        positions = self._pos + np.arange(n) * self.step
+        out = np.interp(positions - base, np.arange(len(source)), source).astype(np.float32)
+        self._pos += n * self.step - len(samples)
+        self._last = samples[-1]
+        return out
+
+class MicrophoneSource:
+    def __init__(self, device: Optional[int] = None, rate: int = audio.WHISPER_SAMPLE_RATE,
+                 channels: int = 1, frames_per_buffer: int = 1024):
+        """
+        PyAudio input stream in callback mode
+
+        PortAudio calls back on its own thread with each buffer; the
+        callback only converts it to 16 kHz mono float32 and hands it on,
+        so nothing on that thread waits for the pipeline. Buffers that
+        PortAudio itself had to drop are counted in overflows.
+        """
+        self.device = device
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.overflows = 0
+        self.finished = False
+        self._pa = None
+        self._stream = None
+
+    @property
+    def name(self) -> str:
+        return f"mic:{self.device if self.device is not None else 'default'}"
+
+    def start(self, on_samples: Callable[[np.ndarray], None]) -> None:
+        import pyaudio # type: ignore
+
+        resampler = StreamResampler(self.rate, audio.WHISPER_SAMPLE_RATE)
+
+        def callback(data, frame_count, time_info, status):
+            if status & pyaudio.paInputOverflow:
+                self.overflows += 1
+            on_samples(resampler.process(_to_mono_float(data, self.channels)))
+            return None, pyaudio.paContinue
+
+        self._pa = pyaudio.PyAudio()
+        try:
+            self._stream = self._pa.open(
+                format=pyaudio.paInt16,
+                channels=self.channels,
+                rate=self.rate,
+                input=True,
+                input_device_index=self.device,
+                frames_per_buffer=self.frames_per_buffer,
+                stream_callback=callback
+            )
+            self._stream.start_stream()
+        except Exception:
+            self._pa.terminate()
+            self._pa = None
+            raise
+
+    def stop(self) -> None:
+        if self._stream is not None:
+            self._stream.stop_stream()
+            self._stream.close()
+            self._stream = None
+        if self._pa is not None:
+            self._pa.terminate()
+            self._pa = None
+
+class ReplaySource:
+    def __init__(self, source: Union[str, np.ndarray], name: Optional[str] = None,
+                 speed: float = 1.0, loop: bool = False, block: int = 1024):
+        """
+        Stand-in for the microphone that plays back a WAV file or samples
+
+        A str is read as a 16-bit PCM WAV file and converted to 16 kHz
+        mono; an array is taken as 16 kHz mono float32 already. Blocks are
+        delivered from a thread at speed times real time (0 for as fast as
+        possible), optionally looping, to exercise capture without a device.
+        """
+        if isinstance(source, str):
+            with wave.open(source, 'rb') as wf:
+                samples = _to_mono_float(wf.readframes(wf.getnframes()), wf.getnchannels())
+                samples = _resample(samples, wf.getframerate(), audio.WHISPER_SAMPLE_RATE)
+            name = name or source
+        else:
+            samples = np.asarray(source, dtype=np.float32)
+        self.samples = samples
+        self._name = name or 'samples'
+        self.speed = speed
+        self.loop = loop
+        self.block = block
+        self.overflows = 0
+        self.finished = False
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def name(self) -> str:
+        return f"replay:{self._name}"
+
+    def _play(self, on_samples: Callable[[np.ndarray], None]) -> None:
+        started = time.monotonic()
+        sent = 0
+        while not self._stop_event.is_set():
+            for start in range(0, len(self.samples), self.block):
+                if self._stop_event.is_set():
+                    break
+                chunk = self.samples[start:start + self.block]
+                on_samples(chunk)
+                sent += len(chunk)
+                if self.speed > 0:
+                    delay = started + sent / (audio.WHISPER_SAMPLE_RATE * self.speed) - time.monotonic()
+                    if delay > 0:
+                        self._stop_event.wait(delay)
+            if not self.loop:
+                break
+        self.finished = True
+
+    def start(self, on_samples: Callable[[np.ndarray], None]) -> None:
+        self._thread = threading.Thread(target=self._play, args=(on_samples,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(5.0)
+
+class CaptureIngester(WindowedIngester):
+    def __init__(self, source, on_window: Callable[[np.ndarray, float], None],
+                 window: float = 30.0, overlap: float = 0.0,
+                 sr: int = audio.WHISPER_SAMPLE_RATE,
+                 denoiser: Optional[audio.SpectralDenoiser] = None,
+                 buffer_seconds: float = 120.0):
+        """
+        Continuous capture from a MicrophoneSource or ReplaySource
+
+        The source's callback only writes into a preallocated ring buffer
+        of buffer_seconds and wakes this thread, which denoises, windows
+        and dispatches the new samples. The callback never blocks on the
+        pipeline; samples are only lost if this thread falls more than
+        buffer_seconds behind, and are then counted as overrun.
+        """
+        super().__init__(on_window, window, overlap, sr, denoiser)
+        self.source = source
+        self.raw = audio.RingBuffer(int(buffer_seconds * sr))
+        self.overrun_samples = 0
+        self._read_pos = 0
+        self._ready = threading.Event()
+
+    def _on_capture(self, samples: np.ndarray) -> None:
+        # Runs on the audio callback thread: copy in and return
+        self.raw.write(samples)
+        self.bytes_read += samples.nbytes
+        self._ready.set()
+
+    def _drain(self) -> None:
+        while True:
+            end = self.raw.total
+            if self._read_pos < self.raw.oldest:
+                self.overrun_samples += self.raw.oldest - self._read_pos
+                self._read_pos = self.raw.oldest
+            if end <= self._read_pos:
+                return
+            samples = self.raw.read(self._read_pos, end)
+            if samples is None:
+                # Overwritten while we looked; catch up on the next pass
+                continue
+            self._read_pos = end
+            self._on_samples(samples)
+
+    def run(self) -> None:
+        try:
+            self.source.start(self._on_capture)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error starting capture from {self.source.name}: {str(e)}")
+            return
+        try:
+            while not self._stop_event.is_set():
+                self._ready.wait(0.5)
+                self._ready.clear()
+                self._drain()
+                if self.source.finished and self._read_pos >= self.raw.total:
+                    break
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error capturing from {self.source.name}: {str(e)}")
+        finally:
+            self.source.stop()
+        try:
+            # Stopped or finished: window what the source delivered last
+            self._drain()
+            self._flush()
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error flushing capture from {self.source.name}: {str(e)}")
+
+    def status(self) -> Dict:
+        return {
+            'source': self.source.name,
+            'seconds_captured': round(self.raw.total / self.sr, 3),
+            'lag_seconds': round((self.raw.total - self._read_pos) / self.sr, 3),
+            'overrun_seconds': round(self.overrun_samples / self.sr, 3),
+            'device_overflows': self.source.overflows,
+            'finished': self.source.finished
+        }
@@ -1,11 +1,501 @@
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from modules import metrics
+
+# Applied to every pooled connection. WAL lets readers run alongside the
+# single writer; NORMAL sync is durable across app crashes in WAL mode.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000"
+)
+
+# Map zoom levels with a maintained cluster aggregate. At zoom z a 256px
+# tile spans 360 / 2**z degrees of longitude; clusters use quarter-tile
+# (64px) cells on an equirectangular grid.
+CLUSTER_LEVELS = range(0, 15)
+CLUSTER_CELLS_PER_TILE = 4
+
+def cluster_cell_size(level: int) -> float:
+    return 360.0 / (2 ** level * CLUSTER_CELLS_PER_TILE)
 
 def open_connection(db_path):
     conn = sqlite3.connect(db_path)
     return conn
 
-def fetch_events(conn, start_date, end_date):
-    query = "SELECT id, longitude, latitude, title, description FROM events WHERE date BETWEEN ? AND ?"
+class ConnectionPool:
+    def __init__(self, db_path: str, size: int = 8, timeout: float = 30.0):
+        """
+        Fixed-size pool of tuned SQLite connections
+
+        Connections are created on demand up to size and handed to one
+        thread at a time. Each keeps its own prepared statement cache, so
+        reusing connections also reuses compiled queries.
+        """
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No database connection free after {self.timeout}s")
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a connection; uncommitted work is rolled back on return
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+class EventWriter:
+    def __init__(self, pool: ConnectionPool, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_queue: int = 10000):
+        """
+        Background writer that inserts events and transcripts in batched transactions
+
+        write() only enqueues; a single thread drains the queue and commits
+        up to batch_size rows per transaction, at least every
+        flush_interval seconds. When the queue is full new events are
+        dropped and counted rather than blocking the caller.
+        """
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Tuple]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="event-writer")
+        self._thread.start()
+
+    def _put(self, item: Tuple) -> bool:
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def write(self, longitude: float, latitude: float, title: str,
+              description: str, date: str, timestamp: Optional[float] = None) -> bool:
+        return self._put(('event', (longitude, latitude, title, description, date, timestamp)))
+
+    def write_transcript(self, text: str, source: str, date: str,
+                         timestamp: Optional[float] = None) -> bool:
+        return self._put(('transcript', (text, source, date, timestamp)))
+
+    def _run(self) -> None:
+        running = True
+        while running:
+            batch: List[Tuple] = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            if batch:
+                self._insert(batch)
+
+    def _insert(self, batch: List[Tuple]) -> None:
+        events = [row for kind, row in batch if kind == 'event']
+        transcripts = [row for kind, row in batch if kind == 'transcript']
+        try:
+            with metrics.timed('db_write'), self.pool.connection() as conn:
+                with conn:
+                    if events:
+                        insert_events(conn, events)
+                    if transcripts:
+                        insert_transcripts(conn, transcripts)
+            self.written += len(batch)
+        except sqlite3.Error as e:
+            self.dropped += len(batch)
+            print(f"Error writing events: {str(e)}")
+
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Flush queued events and stop the writer thread
+        """
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped
+        }
+
+def ensure_schema(conn):
+    """
+    Create the events and transcript tables and their indexes if missing
+
+    transcripts_fts is an FTS5 index of stored transcripts; it is skipped
+    if this SQLite build lacks FTS5. event_clusters holds per-day counts
+    and coordinate sums for each grid cell at every CLUSTER_LEVELS zoom.
+    events_rtree is an R*Tree over each event's point (min == max). Both
+    are kept in sync by triggers and backfilled when first created. Returns False
+    if this SQLite build lacks the R*Tree module; bbox queries then fall
+    back to plain column filters.
+    """
     cur = conn.cursor()
-    cur.execute(query, (start_date, end_date))
-    return cur.fetchall()
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        longitude REAL,
+        latitude REAL,
+        title TEXT,
+        description TEXT,
+        date TEXT,
+        timestamp REAL
+    )
+    ''')
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(events)")]
+    if 'timestamp' not in columns:
+        cur.execute("ALTER TABLE events ADD COLUMN timestamp REAL")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_events_date ON events (date)")
+
+    try:
+        cur.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS transcripts_fts
+        USING fts5(text, source UNINDEXED, date UNINDEXED, timestamp UNINDEXED,
+                   tokenize='porter unicode61')
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search unavailable: {str(e)}")
+
+    _ensure_clusters(cur)
+
+    try:
+        existed = cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'events_rtree'"
+        ).fetchone() is not None
+        cur.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS events_rtree
+        USING rtree(id, min_lon, max_lon, min_lat, max_lat)
+        ''')
+    except sqlite3.OperationalError:
+        conn.commit()
+        return False
+
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS events_rtree_insert AFTER INSERT ON events
+    WHEN new.longitude IS NOT NULL AND new.latitude IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO events_rtree
+        VALUES (new.id, new.longitude, new.longitude, new.latitude, new.latitude);
+    END
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS events_rtree_update AFTER UPDATE OF longitude, latitude ON events
+    BEGIN
+        DELETE FROM events_rtree WHERE id = old.id;
+        INSERT INTO events_rtree
+        SELECT new.id, new.longitude, new.longitude, new.latitude, new.latitude
+        WHERE new.longitude IS NOT NULL AND new.latitude IS NOT NULL;
+    END
+    ''')
+    cur.execute('''
+    CREATE TRIGGER IF NOT EXISTS events_rtree_delete AFTER DELETE ON events
+    BEGIN
+        DELETE FROM events_rtree WHERE id = old.id;
+    END
+    ''')
+    if not existed:
+        cur.execute('''
+        INSERT OR REPLACE INTO events_rtree
+        SELECT id, longitude, longitude, latitude, latitude FROM events
+        WHERE longitude IS NOT NULL AND latitude IS NOT NULL
+        ''')
+    conn.commit()
+    return True
+
+def _ensure_clusters(cur) -> None:
+    existed = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'event_clusters'"
+    ).fetchone() is not None
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS event_cluster_levels (
+        level INTEGER PRIMARY KEY,
+        cell REAL
+    )
+    ''')
+    cur.executemany(
+        "INSERT OR IGNORE INTO event_cluster_levels (level, cell) VALUES (?, ?)",
+        [(level, cluster_cell_size(level)) for level in CLUSTER_LEVELS]
+    )
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS event_clusters (
+        level INTEGER,
+        cell_x INTEGER,
+        cell_y INTEGER,
+        date TEXT,
+        count INTEGER,
+        sum_lon REAL,
+        sum_lat REAL,
+        PRIMARY KEY (level, cell_x, cell_y, date)
+    ) WITHOUT ROWID
+    ''')
+
+    # Offsets keep cell numbers non-negative, so CAST truncation is floor;
+    # MIN keeps lon 180 and lat 90 in the last cell, as _cell_range expects
+    def cell_x(lon):
+        return f"MIN(CAST(({lon} + 180) / cell AS INTEGER), CAST(ROUND(360 / cell) AS INTEGER) - 1)"
+
+    def cell_y(lat):
+        return f"MIN(CAST(({lat} + 90) / cell AS INTEGER), CAST(ROUND(180 / cell) AS INTEGER) - 1)"
+
+    add = f'''
+        INSERT INTO event_clusters (level, cell_x, cell_y, date, count, sum_lon, sum_lat)
+        SELECT level, {cell_x('new.longitude')}, {cell_y('new.latitude')},
+               new.date, 1, new.longitude, new.latitude
+        FROM event_cluster_levels
+        WHERE new.longitude IS NOT NULL AND new.latitude IS NOT NULL
+        ON CONFLICT (level, cell_x, cell_y, date) DO UPDATE SET
+            count = count + 1, sum_lon = sum_lon + excluded.sum_lon, sum_lat = sum_lat + excluded.sum_lat;
+    '''
+    old_cells = f'''
+        old.longitude IS NOT NULL AND old.latitude IS NOT NULL AND date IS old.date
+        AND (level, cell_x, cell_y) IN (
+            SELECT level, {cell_x('old.longitude')}, {cell_y('old.latitude')}
+            FROM event_cluster_levels
+        )
+    '''
+    # Both statements touch only the old event's cells, one row per level
+    remove = f'''
+        UPDATE event_clusters
+        SET count = count - 1, sum_lon = sum_lon - old.longitude, sum_lat = sum_lat - old.latitude
+        WHERE {old_cells};
+        DELETE FROM event_clusters WHERE count <= 0 AND {old_cells};
+    '''
+    # Recreated every time so databases pick up changes to the cell maths
+    for name in ('insert', 'update', 'delete'):
+        cur.execute(f"DROP TRIGGER IF EXISTS event_clusters_{name}")
+    cur.execute(f"CREATE TRIGGER event_clusters_insert AFTER INSERT ON events BEGIN {add} END")
+    cur.execute(
+        "CREATE TRIGGER event_clusters_update "
+        f"AFTER UPDATE OF longitude, latitude, date ON events BEGIN {remove} {add} END"
+    )
+    cur.execute(f"CREATE TRIGGER event_clusters_delete AFTER DELETE ON events BEGIN {remove} END")
+
+    if not existed:
+        cur.execute(f'''
+        INSERT INTO event_clusters (level, cell_x, cell_y, date, count, sum_lon, sum_lat)
+        SELECT level, {cell_x('longitude')}, {cell_y('latitude')},
+               date, COUNT(*), SUM(longitude), SUM(latitude)
+        FROM events CROSS JOIN event_cluster_levels
+        WHERE longitude IS NOT NULL AND latitude IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        ''')
+
+def insert_events(conn, events: Sequence[Tuple]):
+    """
+    Insert (longitude, latitude, title, description, date, timestamp) rows
+    """
+    conn.executemany(
+        "INSERT INTO events (longitude, latitude, title, description, date, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        events
+    )
+
+def insert_transcripts(conn, transcripts: Sequence[Tuple]):
+    """
+    Insert (text, source, date, timestamp) rows into the full-text index
+    """
+    conn.executemany(
+        "INSERT INTO transcripts_fts (text, source, date, timestamp) VALUES (?, ?, ?, ?)",
+        transcripts
+    )
+
+def _fts_query(text: str) -> str:
+    # Quote each term so user input cannot trip FTS5 query syntax
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+def search_transcripts(conn, text: str, start_date: Optional[str] = None,
+                       end_date: Optional[str] = None, limit: int = 50):
+    """
+    Full-text search over stored transcripts, best matches first
+
+    Returns:
+        list: (snippet, text, source, date, timestamp) rows
+    """
+    query = (
+        "SELECT snippet(transcripts_fts, 0, '[', ']', '...', 12), text, source, date, timestamp "
+        "FROM transcripts_fts WHERE transcripts_fts MATCH ?"
+    )
+    params: list = [_fts_query(text)]
+    if start_date and end_date:
+        query += " AND date BETWEEN ? AND ?"
+        params += [start_date, end_date]
+    query += " ORDER BY bm25(transcripts_fts) LIMIT ?"
+    params.append(limit)
+    return conn.execute(query, params).fetchall()
+
+def has_rtree(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'events_rtree'"
+    ).fetchone() is not None
+
+def _events_query(conn, start_date, end_date, bbox: Optional[Sequence[float]] = None,
+                  limit: Optional[int] = None) -> Tuple[str, list]:
+    params = []
+    if bbox is None:
+        query = "SELECT id, longitude, latitude, title, description FROM events WHERE date BETWEEN ? AND ?"
+    elif has_rtree(conn):
+        query = (
+            "SELECT e.id, e.longitude, e.latitude, e.title, e.description "
+            # CROSS JOIN pins the R*Tree as the outer loop; left to itself the
+            # planner walks idx_events_date and probes the R*Tree per row
+            "FROM events_rtree r CROSS JOIN events e ON e.id = r.id "
+            "WHERE r.max_lon >= ? AND r.min_lon <= ? AND r.max_lat >= ? AND r.min_lat <= ? "
+            "AND e.date BETWEEN ? AND ?"
+        )
+        params += [bbox[0], bbox[2], bbox[1], bbox[3]]
+    else:
+        query = (
+            "SELECT id, longitude, latitude, title, description FROM events "
+            "WHERE longitude BETWEEN ? AND ? AND latitude BETWEEN ? AND ? "
+            "AND date BETWEEN ? AND ?"
+        )
+        params += [bbox[0], bbox[2], bbox[1], bbox[3]]
+    params += [start_date, end_date]
+
+    if limit is not None:
+        query += " ORDER BY date DESC LIMIT ?"
+        params.append(limit)
+
+    return query, params
+
+def fetch_events(conn, start_date, end_date, bbox: Optional[Sequence[float]] = None,
+                 limit: Optional[int] = None):
+    """
+    Fetch events in a date range, optionally inside a bounding box
+
+    Args:
+        bbox: (min_lon, min_lat, max_lon, max_lat), as in Leaflet's
+            LatLngBounds.toBBoxString()
+        limit: Return at most this many events, newest first
+    """
+    return list(iter_events(conn, start_date, end_date, bbox, limit))
+
+def iter_events(conn, start_date, end_date, bbox: Optional[Sequence[float]] = None,
+                limit: Optional[int] = None, batch_size: int = 1000):
+    """
+    Same as fetch_events, but yields rows from the cursor in batches
+    instead of materialising the whole result
+    """
+    query, params = _events_query(conn, start_date, end_date, bbox, limit)
+    cur = conn.cursor()
+    cur.execute(query, params)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def _cell_range(low: float, high: float, offset: float, cell: float, cells: int) -> Tuple[int, int]:
+    first = int((max(low, -offset) + offset) / cell)
+    last = int((min(high, offset) + offset) / cell)
+    return max(first, 0), min(last, cells - 1)
+
+def fetch_clusters(conn, start_date, end_date, zoom: int,
+                   bbox: Optional[Sequence[float]] = None, limit: Optional[int] = None):
+    """
+    Aggregate events in a date range into grid cells for a map zoom level
+
+    Reads the event_clusters table maintained by ensure_schema, so the
+    work depends on the number of cells and days in view rather than the
+    number of events. Zooms outside CLUSTER_LEVELS use the nearest level.
+
+    Args:
+        zoom: Map zoom level; cells are a quarter of a tile wide
+        bbox: (min_lon, min_lat, max_lon, max_lat) viewport
+        limit: Return at most this many cells, largest first
+
+    Returns:
+        list: (level, cell_x, cell_y, count, longitude, latitude) rows, the
+            coordinates being the centroid of the cell's events
+    """
+    level = min(max(int(zoom), CLUSTER_LEVELS[0]), CLUSTER_LEVELS[-1])
+    query = (
+        "SELECT level, cell_x, cell_y, SUM(count), SUM(sum_lon) / SUM(count), SUM(sum_lat) / SUM(count) "
+        "FROM event_clusters WHERE level = ?"
+    )
+    params: list = [level]
+    if bbox is not None:
+        cell = cluster_cell_size(level)
+        columns = 2 ** level * CLUSTER_CELLS_PER_TILE
+        query += " AND cell_x BETWEEN ? AND ? AND cell_y BETWEEN ? AND ?"
+        params += _cell_range(bbox[0], bbox[2], 180.0, cell, columns)
+        params += _cell_range(bbox[1], bbox[3], 90.0, cell, columns // 2)
+    query += " AND date BETWEEN ? AND ? GROUP BY cell_x, cell_y"
+    params += [start_date, end_date]
+    if limit is not None:
+        query += " ORDER BY 4 DESC LIMIT ?"
+        params.append(limit)
+    return conn.execute(query, params).fetchall()
@@ -0,0 +1,249 @@
+import bisect
+import csv
+import difflib
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from modules.geocache import normalize_place
+
+# GeoNames feature classes, mapped to the closest Nominatim-style type
+FEATURE_TYPES = {
+    'A': 'administrative',
+    'H': 'water',
+    'L': 'area',
+    'P': 'city',
+    'R': 'road',
+    'S': 'building',
+    'T': 'peak',
+    'U': 'undersea',
+    'V': 'forest'
+}
+
+def _importance_from_population(population: float) -> float:
+    # Rough stand-in for Nominatim importance: ~0.3 for hamlets, ~0.9 for megacities
+    return min(1.0, 0.25 + math.log10(population + 1) / 10)
+
+class Gazetteer:
+    # Names are indexed in batches, by at most this many leading characters
+    TRIGRAM_BATCH = 20000
+    TRIGRAM_MAX_CHARS = 48
+    # Names ranked best by shared trigrams that are scored with difflib
+    FUZZY_CANDIDATES = 32
+
+    def __init__(self, entries: Iterable[Tuple[str, Dict]], cache_size: int = 4096):
+        """
+        In-memory place index for geocoding without network access
+
+        entries are (name, record) pairs where record has latitude,
+        longitude, type and importance. Names are normalized and kept in a
+        sorted array, so exact and prefix lookups are binary searches; when
+        a name occurs more than once the most important record wins.
+        Fuzzy matching uses a trigram index built on the first miss, and
+        the last cache_size fuzzy outcomes, misses included, are kept.
+        """
+        best: Dict[str, Dict] = {}
+        for name, record in entries:
+            key = normalize_place(name)
+            if not key:
+                continue
+            current = best.get(key)
+            if current is None or record['importance'] > current['importance']:
+                best[key] = record
+        self._keys: List[str] = sorted(best)
+        self._records: List[Dict] = [best[key] for key in self._keys]
+        self.cache_size = cache_size
+        self._fuzzy_cache: "OrderedDict[Tuple[str, float], Optional[Tuple[int, float]]]" = OrderedDict()
+        self._gram_codes: Optional[np.ndarray] = None
+        self._gram_starts: Optional[np.ndarray] = None
+        self._gram_owners: Optional[np.ndarray] = None
+        self._gram_counts: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @classmethod
+    def from_csv(cls, path: str) -> "Gazetteer":
+        """
+        Load a CSV with name, latitude and longitude columns
+
+        Optional columns: type, importance and population (used to derive
+        importance when the importance column is missing).
+        """
+        def entries():
+            with open(path, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    try:
+                        if row.get('importance'):
+                            importance = float(row['importance'])
+                        elif row.get('population'):
+                            importance = _importance_from_population(float(row['population']))
+                        else:
+                            importance = 0.5
+                        yield row['name'], {
+                            'latitude': float(row['latitude']),
+                            'longitude': float(row['longitude']),
+                            'type': row.get('type') or 'place',
+                            'importance': importance
+                        }
+                    except (KeyError, ValueError):
+                        continue
+        return cls(entries())
+
+    @classmethod
+    def from_geonames(cls, path: str, include_alternates: bool = False) -> "Gazetteer":
+        """
+        Load a GeoNames dump (allCountries.txt, US.txt, cities15000.txt, ...)
+        """
+        def entries():
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) < 15:
+                        continue
+                    try:
+                        record = {
+                            'latitude': float(fields[4]),
+                            'longitude': float(fields[5]),
+                            'type': FEATURE_TYPES.get(fields[6], 'place'),
+                            'importance': _importance_from_population(float(fields[14] or 0))
+                        }
+                    except ValueError:
+                        continue
+                    yield fields[1], record
+                    if fields[2] and fields[2] != fields[1]:
+                        yield fields[2], record
+                    if include_alternates and fields[3]:
+                        for alternate in fields[3].split(','):
+                            yield alternate, record
+        return cls(entries())
+
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        """
+        Load a gazetteer file, picking the parser from its extension
+        """
+        if path.lower().endswith('.csv'):
+            return cls.from_csv(path)
+        return cls.from_geonames(path)
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect.bisect_left(self._keys, prefix)
+        hi = bisect.bisect_left(self._keys, prefix + '\uffff')
+        return lo, hi
+
+    def lookup(self, place: str, fuzzy_cutoff: float = 0.85) -> Optional[Dict]:
+        """
+        Resolve a place name locally
+
+        Tries an exact match, then the most important name whose leading
+        words are the query ("springfield" finds "springfield township"),
+        then the closest fuzzy match among the names sharing the most
+        trigrams with it.
+        Prefix and fuzzy matches have their importance scaled down.
+
+        Returns:
+            Dict: Same shape as GeoLocator.get_location, or None
+        """
+        key = normalize_place(place)
+        if not key:
+            return None
+
+        index = bisect.bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return self._result(place, index, 1.0)
+
+        lo, hi = self._prefix_range(key + ' ')
+        if lo < hi:
+            best = max(range(lo, hi), key=lambda i: self._records[i]['importance'])
+            return self._result(place, best, 0.9)
+
+        cache_key = (key, fuzzy_cutoff)
+        with self._lock:
+            cached = self._fuzzy_cache.get(cache_key, False)
+            if cached is not False:
+                self._fuzzy_cache.move_to_end(cache_key)
+        if cached is False:
+            cached = self._fuzzy(key, fuzzy_cutoff)
+            with self._lock:
+                self._fuzzy_cache[cache_key] = cached
+                while len(self._fuzzy_cache) > self.cache_size:
+                    self._fuzzy_cache.popitem(last=False)
+        if cached is None:
+            return None
+        return self._result(place, cached[0], cached[1])
+
+    def _build_trigrams(self) -> None:
+        # Inverted index from padded character trigrams to key positions:
+        # unique trigram codes, and for each the slice of positions holding it
+        codes, owners = [], []
+        for start in range(0, len(self._keys), self.TRIGRAM_BATCH):
+            batch = [' ' + key[:self.TRIGRAM_MAX_CHARS] + ' ' for key in self._keys[start:start + self.TRIGRAM_BATCH]]
+            width = max(len(key) for key in batch)
+            chars = np.array(batch, dtype=f'U{width}').view(np.uint32).reshape(len(batch), width).astype(np.int64)
+            grams = (chars[:, :-2] << 42) | (chars[:, 1:-1] << 21) | chars[:, 2:]
+            lengths = np.array([len(key) for key in batch])
+            valid = np.arange(width - 2) < (lengths - 2)[:, None]
+            rows = np.nonzero(valid)[0]
+            codes.append(grams[valid])
+            owners.append((rows + start).astype(np.int32))
+        codes = np.concatenate(codes) if codes else np.zeros(0, dtype=np.int64)
+        owners = np.concatenate(owners) if owners else np.zeros(0, dtype=np.int32)
+        order = np.lexsort((owners, codes))
+        codes, owners = codes[order], owners[order]
+        # A trigram repeated within one name counts once
+        keep = np.ones(len(codes), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (owners[1:] != owners[:-1])
+        codes, owners = codes[keep], owners[keep]
+        self._gram_codes, starts = np.unique(codes, return_index=True)
+        self._gram_starts = np.append(starts, len(codes)).astype(np.int64)
+        self._gram_owners = owners
+        self._gram_counts = np.bincount(owners, minlength=len(self._keys)).astype(np.int32)
+
+    @staticmethod
+    def _trigram_codes(key: str) -> np.ndarray:
+        padded = ' ' + key[:Gazetteer.TRIGRAM_MAX_CHARS] + ' '
+        return np.unique(np.array(
+            [(ord(a) << 42) | (ord(b) << 21) | ord(c) for a, b, c in zip(padded, padded[1:], padded[2:])],
+            dtype=np.int64
+        ))
+
+    def _fuzzy(self, key: str, cutoff: float) -> Optional[Tuple[int, float]]:
+        with self._lock:
+            if self._gram_codes is None:
+                self._build_trigrams()
+        grams = self._trigram_codes(key)
+        if not len(self._gram_codes):
+            return None
+        positions = np.searchsorted(self._gram_codes, grams)
+        clipped = np.minimum(positions, len(self._gram_codes) - 1)
+        found = positions[(positions < len(self._gram_codes)) & (self._gram_codes[clipped] == grams)]
+        if not len(found):
+            return None
+        candidates = np.concatenate([
+            self._gram_owners[self._gram_starts[i]:self._gram_starts[i + 1]] for i in found
+        ])
+        owners, shared = np.unique(candidates, return_counts=True)
+        # Dice similarity of trigram sets; only the best few reach difflib
+        dice = 2.0 * shared / (len(grams) + self._gram_counts[owners])
+        top = owners[np.argsort(-dice, kind='stable')[:self.FUZZY_CANDIDATES]]
+        best = None
+        for index in top.tolist():
+            ratio = difflib.SequenceMatcher(None, key, self._keys[index]).ratio()
+            if ratio >= cutoff and (best is None or ratio > best[1]):
+                best = (index, ratio)
+        return best
+
+    def _result(self, place: str, index: int, score: float) -> Dict:
+        record = self._records[index]
+        return {
+            'location': place,
+            'latitude': record['latitude'],
+            'longitude': record['longitude'],
+            'type': record['type'],
+            'importance': record['importance'] * score
+        }
@@ -1,13 +1,78 @@
 import requests
-from time import sleep
-from typing import List, Dict, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from typing import Callable, List, Dict, Optional, Tuple
+from modules.geocache import GeoCache
+from modules.gazetteer import Gazetteer
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        Thread-safe token bucket allowing rate calls per second on average
+
+        capacity is the burst size. pause() empties the bucket for a while,
+        so one 429 backs off every caller sharing the bucket.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Block until a token is available and take it
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+            self._updated = time.monotonic()
+
+# Nominatim's usage policy allows one request per second per application,
+# so every GeoLocator in the process shares this bucket by default
+nominatim_limiter = TokenBucket(rate=1.0)
 
 class GeoLocator:
-    def __init__(self):
-        self.base_url = "https://nominatim.openstreetmap.org/search"
+    def __init__(self, cache: Optional[GeoCache] = None,
+                 gazetteer: Optional[Gazetteer] = None, offline: bool = False,
+                 rate_limiter: Optional[TokenBucket] = None, workers: int = 4,
+                 base_url: str = "https://nominatim.openstreetmap.org/search"):
+        """
+        Geocode place names with Nominatim, a local gazetteer, or both
+
+        With a gazetteer the local index is tried first; offline=True stops
+        there and never touches the network. Network lookups run on up to
+        workers threads over one keep-alive session, paced by rate_limiter.
+        """
+        if offline and gazetteer is None:
+            raise ValueError("Offline geocoding needs a gazetteer")
+        self.cache = cache
+        self.gazetteer = gazetteer
+        self.offline = offline
+        self.rate_limiter = rate_limiter or nominatim_limiter
+        self.base_url = base_url
         self.headers = {
             'User-Agent': '12scan/1.0 (police scanner analysis tool)'
         }
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="geocode")
         self.skip_words = {
             'ai', 'first', 'today', 'end', 'two', 'three', 'years', 'smart',
             'intel', 'spr', 'gis', 'the', 'a', 'an', 'and', 'or', 'but',
@@ -27,10 +92,56 @@ class GeoLocator:
             return False
         return True
 
+    def close(self) -> None:
+        """
+        Stop the lookup threads and drop the keep-alive session
+        """
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
     def get_location(self, place: str) -> Optional[Dict]:
+        found, result = self._resolve_local(place)
+        if found:
+            return result
+        return self._resolve_remote(place)
+
+    def _resolve_local(self, place: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        Resolve a place without the network: filters, gazetteer and cache
+
+        Returns:
+            tuple: (found, result); found is False when only the geocoding
+            service can answer
+        """
         if not self._should_geocode(place):
-            return None
+            return True, None
+
+        if self.gazetteer is not None:
+            result = self.gazetteer.lookup(place)
+            if result is not None or self.offline:
+                return True, result
+
+        if self.cache is not None:
+            hit, result = self.cache.get(place)
+            if hit:
+                return True, (dict(result, location=place) if result else None)
+
+        return False, None
 
+    def _resolve_remote(self, place: str) -> Optional[Dict]:
+        resolved, result = self._query(place)
+        if resolved and self.cache is not None:
+            self.cache.set(place, result)
+        return result
+
+    def _query(self, place: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        Query the geocoding service
+
+        Returns:
+            tuple: (resolved, result); resolved is False when the service
+            could not be reached, so the miss must not be cached
+        """
         params = {
             'q': place,
             'format': 'json',
@@ -44,10 +155,10 @@ class GeoLocator:
 
         for attempt in range(max_retries):
             try:
-                response = requests.get(
+                self.rate_limiter.acquire()
+                response = self.session.get(
                     self.base_url,
                     params=params,
-                    headers=self.headers,
                     timeout=10
                 )
 
@@ -57,9 +168,9 @@ class GeoLocator:
                         result = results[0]
                         location_type = result.get('type', '')
                         if location_type in ['house', 'address']:
-                            return None
+                            return True, None
                             
-                        return {
+                        return True, {
                             'location': place,
                             'latitude': float(result['lat']),
                             'longitude': float(result['lon']),
@@ -67,23 +178,36 @@ class GeoLocator:
                             'importance': float(result.get('importance', 0))
                         }
                 elif response.status_code in [429, 503, 502, 504]:
-                    sleep(retry_delay * (attempt + 1))
+                    # Back off every caller sharing the limiter, not just this one
+                    delay = retry_delay * (attempt + 1)
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.isdigit():
+                        delay = max(delay, int(retry_after))
+                    self.rate_limiter.pause(delay)
                     continue
                 
-                return None
+                return response.status_code == 200, None
 
             except requests.exceptions.RequestException as e:
                 if attempt < max_retries - 1:
-                    sleep(retry_delay * (attempt + 1))
+                    time.sleep(retry_delay * (attempt + 1))
                     continue
                 print(f"Error finding location for {place}: {str(e)}")
-                return None
+                return False, None
 
-        return None
+        return False, None
 
-    def locate_entities(self, entities: List[Dict]) -> List[Dict]:
+    def locate_entities(self, entities: List[Dict],
+                        on_location: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
         locations = []
         processed = set()
+        remote = []
+
+        def accept(result):
+            if result and result['importance'] > 0.2:
+                locations.append(result)
+                if on_location:
+                    on_location(result)
         
         try:
             for entity in entities:
@@ -91,10 +215,16 @@ class GeoLocator:
                     location = entity['entity'].strip()
                     if location and location not in processed:
                         processed.add(location)
-                        result = self.get_location(location)
-                        if result and result['importance'] > 0.2:
-                            locations.append(result)
-                        sleep(1.5)
+                        found, result = self._resolve_local(location)
+                        if found:
+                            accept(result)
+                        else:
+                            remote.append(location)
+
+            # Network lookups run concurrently; the shared limiter paces them
+            futures = [self._executor.submit(self._resolve_remote, place) for place in remote]
+            for future in as_completed(futures):
+                accept(future.result())
             
             locations.sort(key=lambda x: x['importance'], reverse=True)
             return locations[:10]
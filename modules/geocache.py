@@ -0,0 +1,153 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from modules.db import ConnectionPool
+
+def normalize_place(place: str) -> str:
+    """
+    Cache key for a place name: lower case, punctuation and extra spaces removed
+    """
+    return ' '.join(re.sub(r'[^\w\s-]', ' ', place.lower()).split())
+
+def ensure_schema(conn) -> None:
+    """
+    Create the geocode_cache table if missing
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        key TEXT PRIMARY KEY,
+        result TEXT,
+        expires REAL
+    )
+    ''')
+    conn.commit()
+
+class GeoCache:
+    def __init__(self, pool: Optional[ConnectionPool] = None,
+                 max_entries: int = 4096, ttl: float = 30 * 86400,
+                 negative_ttl: float = 86400):
+        """
+        Two-tier cache of geocoding results
+
+        An in-process LRU sits in front of a geocode_cache table in the
+        SQLite database. Places that did not resolve are cached as None
+        for the shorter negative_ttl. Without a pool it is memory only.
+        Expired rows are purged at startup and whenever one is read.
+        """
+        self.pool = pool
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._memory: "OrderedDict[str, Tuple[float, Optional[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        if pool is not None:
+            with pool.connection() as conn:
+                ensure_schema(conn)
+            # Expired rows are otherwise only dropped one by one as they are read
+            try:
+                self.purge_expired()
+            except sqlite3.Error as e:
+                print(f"Geocode cache purge error: {str(e)}")
+
+    def _remember(self, key: str, expires: float, value: Optional[Dict]) -> None:
+        with self._lock:
+            self._memory[key] = (expires, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, place: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        Look up a place
+
+        Returns:
+            tuple: (hit, result); result may be None on a hit when the
+            place is known not to resolve
+        """
+        key = normalize_place(place)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return True, entry[1]
+                del self._memory[key]
+
+        if self.pool is not None:
+            try:
+                with self.pool.connection() as conn:
+                    row = conn.execute(
+                        "SELECT result, expires FROM geocode_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and row[1] <= now:
+                        conn.execute("DELETE FROM geocode_cache WHERE key = ? AND expires <= ?",
+                                     (key, now))
+                        conn.commit()
+            except sqlite3.Error as e:
+                print(f"Geocode cache read error: {str(e)}")
+                row = None
+            if row is not None and row[1] > now:
+                value = json.loads(row[0]) if row[0] is not None else None
+                self._remember(key, row[1], value)
+                with self._lock:
+                    self.db_hits += 1
+                return True, value
+
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def set(self, place: str, value: Optional[Dict]) -> None:
+        """
+        Store a result, or None for a place that did not resolve
+        """
+        key = normalize_place(place)
+        expires = time.time() + (self.ttl if value is not None else self.negative_ttl)
+        self._remember(key, expires, value)
+
+        if self.pool is not None:
+            try:
+                with self.pool.connection() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO geocode_cache (key, result, expires) VALUES (?, ?, ?)",
+                        (key, json.dumps(value) if value is not None else None, expires)
+                    )
+                    conn.commit()
+            except sqlite3.Error as e:
+                print(f"Geocode cache write error: {str(e)}")
+
+    def purge_expired(self) -> int:
+        """
+        Delete expired rows from the persistent table
+
+        Returns:
+            int: Number of rows removed
+        """
+        if self.pool is None:
+            return 0
+        with self.pool.connection() as conn:
+            cur = conn.execute("DELETE FROM geocode_cache WHERE expires <= ?", (time.time(),))
+            conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            total = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': hits / total if total else 0.0,
+                'memory_entries': len(self._memory)
+            }
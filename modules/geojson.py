@@ -0,0 +1,90 @@
+import json
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, Sequence
+
+from modules import db
+
+# Columns of the rows produced by db.iter_events
+EVENT_COLUMNS = ['id', 'longitude', 'latitude', 'title', 'description']
+# Columns of the rows produced by db.fetch_clusters
+CLUSTER_COLUMNS = ['level', 'cell_x', 'cell_y', 'count', 'longitude', 'latitude']
+
+def _chunked(parts: Iterable[str], size: int) -> Iterator[bytes]:
+    # Coalesce small JSON fragments into writes of roughly size bytes
+    buffer = []
+    length = 0
+    for part in parts:
+        buffer.append(part)
+        length += len(part)
+        if length >= size:
+            yield ''.join(buffer).encode()
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+def event_feature(row: Sequence) -> Dict:
+    return {
+        'type': 'Feature',
+        'id': row[0],
+        'geometry': {'type': 'Point', 'coordinates': [row[1], row[2]]},
+        'properties': {'title': row[3], 'description': row[4]}
+    }
+
+def cluster_feature(row: Sequence) -> Dict:
+    """
+    GeoJSON feature for a db.fetch_clusters row, placed at its centroid
+
+    properties.bbox is the cell's extent, for zooming into the cluster.
+    """
+    level, cell_x, cell_y, count, longitude, latitude = row
+    cell = db.cluster_cell_size(level)
+    return {
+        'type': 'Feature',
+        'id': f'cluster/{level}/{cell_x}/{cell_y}',
+        'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+        'properties': {
+            'cluster': True,
+            'count': count,
+            'bbox': [cell_x * cell - 180, cell_y * cell - 90,
+                     (cell_x + 1) * cell - 180, (cell_y + 1) * cell - 90]
+        }
+    }
+
+def iter_feature_collection(rows: Iterable[Sequence], chunk_size: int = 16384,
+                            to_feature: Callable[[Sequence], Dict] = event_feature) -> Iterator[bytes]:
+    """
+    Serialize rows as a GeoJSON FeatureCollection, one feature at a time
+    """
+    def parts():
+        yield '{"type":"FeatureCollection","features":['
+        for index, row in enumerate(rows):
+            yield (',' if index else '') + json.dumps(to_feature(row), separators=(',', ':'))
+        yield ']}'
+    return _chunked(parts(), chunk_size)
+
+def iter_compact(rows: Iterable[Sequence], chunk_size: int = 16384,
+                 columns: Sequence[str] = EVENT_COLUMNS) -> Iterator[bytes]:
+    """
+    Serialize rows as {"columns": [...], "rows": [[...], ...]}
+
+    Field names are sent once instead of per feature, which roughly
+    halves the payload for large ranges.
+    """
+    def parts():
+        yield '{"columns":' + json.dumps(list(columns)) + ',"rows":['
+        for index, row in enumerate(rows):
+            yield (',' if index else '') + json.dumps(list(row), separators=(',', ':'))
+        yield ']}'
+    return _chunked(parts(), chunk_size)
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Gzip a byte stream incrementally
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,47 @@
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from modules.db import EventWriter
+
+class HistoryRecorder:
+    def __init__(self, writer: EventWriter, excerpt_length: int = 300):
+        """
+        Persist pipeline output through the background EventWriter
+
+        Each geocoded location becomes an event whose description is the
+        transcript segment that mentioned it; the transcript itself goes
+        into the full-text index. Nothing here touches the database on the
+        caller's thread.
+        """
+        self.writer = writer
+        self.excerpt_length = excerpt_length
+
+    def _excerpt(self, location: Dict, segments: List[Dict], entities: List[Dict]) -> str:
+        for entity in entities:
+            index = entity.get('segment')
+            if entity['entity'].strip() == location['location'] and index is not None:
+                return segments[index]['text'][:self.excerpt_length]
+        return ' '.join(seg['text'] for seg in segments)[:self.excerpt_length]
+
+    def record(self, segments: List[Dict], entities: List[Dict],
+               locations: List[Dict], source: Optional[str] = None) -> None:
+        """
+        Queue the events and transcript for one analysed chunk of audio
+        """
+        text = ' '.join(seg['text'] for seg in segments).strip()
+        if not text:
+            return
+        now = time.time()
+        date = datetime.fromtimestamp(now).strftime('%Y-%m-%d')
+        source = source or 'unknown'
+
+        self.writer.write_transcript(text, source, date, now)
+        for location in locations:
+            self.writer.write(
+                location['longitude'],
+                location['latitude'],
+                location['location'],
+                self._excerpt(location, segments, entities),
+                date,
+                now
+            )
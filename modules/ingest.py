@@ -0,0 +1,316 @@
+import queue
+import re
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import requests
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from modules import audio
+
+def _words(text: str) -> List[str]:
+    return [re.sub(r'[^\w]', '', word.lower()) for word in text.split()]
+
+def merge_overlap(previous: str, current: str, max_words: int = 20) -> str:
+    """
+    Drop the start of current where it repeats the end of previous
+
+    Args:
+        previous (str): Text already emitted
+        current (str): Text from the next, overlapping window
+        max_words (int): Longest overlap to look for
+
+    Returns:
+        str: current without the repeated words
+    """
+    prev_words = _words(previous)[-max_words:]
+    cur_original = current.split()
+    cur_words = _words(current)
+    for k in range(min(len(prev_words), len(cur_words)), 0, -1):
+        if prev_words[-k:] == cur_words[:k]:
+            return ' '.join(cur_original[k:])
+    return current
+
+class TranscriptMerger:
+    def __init__(self, tolerance: float = 0.5):
+        """
+        Stitch segments from overlapping windows into one running transcript
+
+        Segments that end before what has already been emitted are dropped;
+        a segment straddling the boundary is trimmed by word overlap.
+        """
+        self.tolerance = tolerance
+        self.end_time = 0.0
+        self._tail = ''
+
+    def add(self, offset: float, segments: List[Dict]) -> List[Dict]:
+        """
+        Merge one window's segments
+
+        Args:
+            offset (float): Window start on the stream timeline, in seconds
+            segments (list): Segments with start/end relative to the window
+
+        Returns:
+            list: New segments with absolute start/end
+        """
+        merged = []
+        for seg in segments:
+            start = offset + seg['start']
+            end = offset + seg['end']
+            text = seg['text'].strip()
+            if end <= self.end_time + self.tolerance:
+                continue
+            if start < self.end_time:
+                text = merge_overlap(self._tail, text)
+                start = self.end_time
+            if not text:
+                continue
+            merged.append({'text': text, 'start': start, 'end': end})
+            self.end_time = end
+            self._tail = ' '.join((self._tail + ' ' + text).split()[-40:])
+        return merged
+
+class WindowedIngester(threading.Thread):
+    def __init__(self, on_window: Callable[[np.ndarray, float], None],
+                 window: float = 30.0, overlap: float = 5.0,
+                 sr: int = audio.WHISPER_SAMPLE_RATE,
+                 denoiser: Optional[audio.SpectralDenoiser] = None):
+        """
+        Base for threads that turn a live sample source into overlapping windows
+
+        Samples passed to _on_samples go into a ring buffer; every
+        window - overlap seconds on_window(samples, offset) receives the
+        latest window seconds, offset being its start in stream time. With
+        a denoiser, samples are cleaned before they reach the buffer.
+        Subclasses implement run().
+        """
+        super().__init__(daemon=True)
+        if overlap >= window:
+            raise ValueError("overlap must be shorter than window")
+        self.on_window = on_window
+        self.sr = sr
+        self.denoiser = denoiser
+        self.window_samples = int(window * sr)
+        self.hop_samples = int((window - overlap) * sr)
+        self.buffer = audio.RingBuffer(self.window_samples * 2)
+        self.bytes_read = 0
+        self.reconnects = 0
+        self.error: Optional[str] = None
+        self._next_start = 0
+        self._emitted_end = 0
+        self._stop_event = threading.Event()
+
+    def _on_samples(self, samples: np.ndarray) -> None:
+        if self.denoiser is not None:
+            samples = self.denoiser.process(samples)
+        self.buffer.write(samples)
+        while self.buffer.total >= self._next_start + self.window_samples:
+            start = max(self._next_start, self.buffer.oldest)
+            window = self.buffer.read(start, start + self.window_samples)
+            self._next_start = start + self.hop_samples
+            if window is not None:
+                self._emitted_end = start + self.window_samples
+                self.on_window(window, start / self.sr)
+
+    def _flush(self) -> None:
+        # End of a finite source: emit whatever the last full window missed
+        if self.denoiser is not None:
+            self.buffer.write(self.denoiser.flush())
+        end = self.buffer.total
+        if end <= self._emitted_end:
+            return
+        start = max(end - self.window_samples, self.buffer.oldest)
+        window = self.buffer.read(start, end)
+        if window is not None:
+            self._emitted_end = end
+            self.on_window(window, start / self.sr)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    @property
+    def seconds_buffered(self) -> float:
+        return self.buffer.total / self.sr
+
+class StreamIngester(WindowedIngester):
+    def __init__(self, stream_url: str, on_window: Callable[[np.ndarray, float], None],
+                 window: float = 30.0, overlap: float = 5.0,
+                 sr: int = audio.WHISPER_SAMPLE_RATE,
+                 denoiser: Optional[audio.SpectralDenoiser] = None):
+        """
+        Keep a stream connection open and emit overlapping audio windows
+
+        Encoded audio is decoded incrementally and windowed as in
+        WindowedIngester. The connection is re-opened with backoff if it
+        drops; a denoiser's noise profile carries over between reconnects.
+        """
+        super().__init__(on_window, window, overlap, sr, denoiser)
+        self.stream_url = stream_url
+
+    def run(self) -> None:
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            decoder = None
+            try:
+                with requests.get(self.stream_url, stream=True, timeout=10) as r:
+                    r.raise_for_status()
+                    decoder = audio.StreamDecoder(self._on_samples, self.sr)
+                    backoff = 1.0
+                    self.error = None
+                    for block in r.iter_content(16384):
+                        if self._stop_event.is_set():
+                            break
+                        self.bytes_read += len(block)
+                        if not decoder.feed(block):
+                            break
+            except Exception as e:
+                self.error = str(e)
+                print(f"Error ingesting {self.stream_url}: {str(e)}")
+            finally:
+                if decoder is not None:
+                    decoder.close()
+
+            if not self._stop_event.is_set():
+                self.reconnects += 1
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+class MultipartFile:
+    def __init__(self, stream, boundary: bytes, field: str = 'audio', chunk_size: int = 65536):
+        """
+        Read one file field of a multipart/form-data body as it arrives
+
+        Parts before the file are skipped; iterating yields the file's
+        bytes without spooling the body to memory or disk first.
+        filename is None if the body has no such field.
+        """
+        self.stream = stream
+        self.boundary = boundary
+        self.field = field
+        self.chunk_size = chunk_size
+        self.filename: Optional[str] = None
+        self._chunks = self._read()
+        # Runs up to the file's first bytes, which sets filename
+        self._first = next(self._chunks, None)
+
+    def _read(self) -> Iterator[bytes]:
+        decoder = MultipartDecoder(self.boundary)
+        in_file = False
+        while True:
+            data = self.stream.read(self.chunk_size)
+            decoder.receive_data(data or None)
+            event = decoder.next_event()
+            while not isinstance(event, NeedData):
+                if isinstance(event, Epilogue):
+                    return
+                if isinstance(event, (File, Field)):
+                    in_file = isinstance(event, File) and event.name == self.field
+                    if in_file:
+                        self.filename = event.filename or ''
+                elif isinstance(event, Data) and in_file:
+                    if event.data:
+                        yield event.data
+                    if not event.more_data:
+                        return
+                event = decoder.next_event()
+            if not data:
+                return
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._first is not None:
+            yield self._first
+        yield from self._chunks
+
+class UploadIngester(WindowedIngester):
+    def __init__(self, chunks: Iterable[bytes], window: float = 30.0, overlap: float = 5.0,
+                 sr: int = audio.WHISPER_SAMPLE_RATE, max_bytes: Optional[int] = None,
+                 max_seconds: Optional[float] = None, max_pending: int = 2):
+        """
+        Decode an upload while it is still being received
+
+        Encoded chunks are read on this thread and fed to a StreamDecoder;
+        completed windows are queued for windows(). At most max_pending
+        windows wait, so a slow consumer stalls the decoder and the upload
+        rather than growing memory. Exceeding max_bytes or max_seconds
+        stops reading and sets rejected; an upload that cannot be read or
+        decoded to the end stops it and sets failed. Either way the windows
+        already yielded are only part of the audio.
+        """
+        super().__init__(self._put_window, window, overlap, sr)
+        self.chunks = chunks
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.rejected = False
+        self.failed = False
+        self._windows: "queue.Queue[Optional[Tuple[np.ndarray, float]]]" = queue.Queue(max_pending)
+
+    def _reject(self, message: str) -> None:
+        self.error = message
+        self.rejected = True
+        self.stop()
+
+    def _fail(self, message: str) -> None:
+        self.error = message
+        self.failed = True
+        self.stop()
+
+    def _on_samples(self, samples: np.ndarray) -> None:
+        if self._stop_event.is_set():
+            return
+        if self.max_seconds and (self.buffer.total + len(samples)) / self.sr > self.max_seconds:
+            self._reject(f"Audio is longer than {self.max_seconds:g} seconds")
+            return
+        super()._on_samples(samples)
+
+    def _put_window(self, samples: Optional[np.ndarray], offset: float = 0.0) -> None:
+        item = None if samples is None else (samples, offset)
+        while not self._stop_event.is_set():
+            try:
+                self._windows.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def run(self) -> None:
+        decoder = None
+        try:
+            decoder = audio.StreamDecoder(self._on_samples, self.sr)
+            for block in self.chunks:
+                if self._stop_event.is_set():
+                    break
+                self.bytes_read += len(block)
+                if self.max_bytes and self.bytes_read > self.max_bytes:
+                    self._reject(f"Upload is larger than {self.max_bytes} bytes")
+                    break
+                if not decoder.feed(block):
+                    self._fail("Decoder exited before the end of the upload")
+                    break
+        except Exception as e:
+            self._fail(str(e))
+            print(f"Error reading upload: {str(e)}")
+        finally:
+            if decoder is not None:
+                # However long the consumer stalls the reader, the tail of a
+                # complete upload is kept; only stop() or a rejection kills ffmpeg
+                decoder.close(timeout=None, abort=self._stop_event)
+        # Flush only once the reader is done, or windows would race it
+        if not self._stop_event.is_set() and (decoder is None or decoder.finished):
+            self._flush()
+            self._put_window(None)
+
+    def windows(self) -> Iterator[Tuple[np.ndarray, float]]:
+        """
+        Yield (samples, offset) windows until the upload is fully decoded
+        """
+        while True:
+            try:
+                item = self._windows.get(timeout=0.5)
+            except queue.Empty:
+                if not self.is_alive() and self._windows.empty():
+                    return
+                continue
+            if item is None:
+                return
+            yield item
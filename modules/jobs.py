@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from modules import metrics
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are waiting to run"""
+
+class Job:
+    def __init__(self, kind: str):
+        """
+        A background pipeline run and the ordered events it has produced
+
+        Events are kept for the lifetime of the job so a client that
+        reconnects with Last-Event-ID can replay what it missed.
+        """
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.events: List[Tuple[str, Any]] = []
+        self._cond = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('done', 'error')
+
+    def emit(self, event: str, data: Any) -> None:
+        with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+
+    def finish(self, result: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.status = 'error' if error else 'done'
+            self.finished = time.time()
+            if error:
+                self.events.append(('error', {'error': error}))
+            else:
+                self.events.append(('done', result))
+            self._cond.notify_all()
+
+    def iter_events(self, start: int = 0,
+                    keepalive: float = 15.0) -> Iterator[Optional[Tuple[int, str, Any]]]:
+        """
+        Yield (index, event, data) from start onwards until the job ends
+
+        Yields None whenever keepalive seconds pass without a new event so
+        the caller can send a heartbeat through idle proxies.
+        """
+        index = start
+        while True:
+            with self._cond:
+                if index >= len(self.events) and not self.done:
+                    self._cond.wait(timeout=keepalive)
+                pending = self.events[index:]
+                finished = self.done
+            if not pending:
+                if finished:
+                    return
+                yield None
+                continue
+            for event, data in pending:
+                yield index, event, data
+                index += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created': self.created,
+            'finished': self.finished,
+            'result': self.result,
+            'error': self.error
+        }
+
+class JobManager:
+    def __init__(self, workers: int = 4, max_pending: int = 32, ttl: float = 3600.0):
+        """
+        Run pipeline jobs in the background and keep them for ttl seconds
+
+        workers bounds how many jobs run at once; max_pending bounds the
+        jobs that may be queued or running before submit is refused.
+        """
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def submit(self, kind: str, fn: Callable[[Job], Optional[Dict]]) -> Job:
+        """
+        Start fn(job) in the background
+
+        fn emits partial results through job.emit and returns the final
+        payload. An exception or a None return marks the job as failed.
+
+        Raises:
+            JobQueueFullError: If max_pending jobs are already active
+        """
+        self._prune()
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if not job.done)
+            if active >= self.max_pending:
+                raise JobQueueFullError(f"Too many active jobs ({active})")
+            job = Job(kind)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Optional[Dict]]) -> None:
+        metrics.record_queue_wait('jobs', time.time() - job.created)
+        job.status = 'running'
+        job.emit('status', {'status': 'running'})
+        try:
+            result = fn(job)
+            if result is None:
+                job.finish(error=job.error or 'Processing failed')
+            else:
+                job.finish(result=result)
+        except Exception as e:
+            print(f"Job {job.id} error: {str(e)}")
+            job.finish(error=str(e))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.done and job.finished < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+def sse_stream(job: Job, last_event_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Format a job's events as a text/event-stream body
+
+    Args:
+        job (Job): Job to follow
+        last_event_id (str): Value of the Last-Event-ID header, if any
+
+    Returns:
+        Iterator[str]: Server-sent event frames
+    """
+    start = 0
+    if last_event_id and last_event_id.isdigit():
+        start = int(last_event_id) + 1
+
+    yield "retry: 3000\n\n"
+    for item in job.iter_events(start):
+        if item is None:
+            yield ": keep-alive\n\n"
+            continue
+        index, event, data = item
+        yield f"id: {index}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
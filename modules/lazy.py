@@ -0,0 +1,28 @@
+import threading
+from typing import Any, Callable
+
+class Lazy:
+    def __init__(self, factory: Callable[[], Any]):
+        """
+        Thread-safe proxy that builds an expensive object on first use
+
+        Attribute access is forwarded to the object, so a Lazy can stand in
+        wherever the object itself is expected.
+        """
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not None
+
+    def get(self) -> Any:
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+        return self._value
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
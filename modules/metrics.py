@@ -0,0 +1,238 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds, from a cached lookup up to a slow Whisper run on a long clip
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Audio seconds handled per second of processing
+SPEED_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: (bucket counts, sum, count); counts are not cumulative
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(entry[0]), entry[1], entry[2]))
+                           for key, entry in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class Collected:
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str],
+                 collect: Callable[[], Sequence[Tuple[Sequence[str], float]]]):
+        """
+        Metric read from existing counters at scrape time
+
+        collect returns (label values, value) pairs, so components that
+        already keep stats need no changes to be exported.
+        """
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            samples = self.collect()
+        except Exception as e:
+            print(f"Error collecting {self.name}: {str(e)}")
+            return lines
+        for values, value in samples:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        """
+        Metrics rendered together in the Prometheus text exposition format
+        """
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def collected(self, name: str, help: str, kind: str = 'gauge',
+                  labelnames: Sequence[str] = (),
+                  collect: Callable[[], Sequence[Tuple[Sequence[str], float]]] = list) -> Collected:
+        with self._lock:
+            metric = self._metrics[name] = Collected(name, help, kind, labelnames, collect)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'pdscanner_stage_seconds', 'Time spent in each processing stage', ('stage',)
+)
+QUEUE_WAIT_SECONDS = registry.histogram(
+    'pdscanner_queue_wait_seconds', 'Time work waited in a queue before it started', ('queue',)
+)
+AUDIO_SECONDS = registry.counter(
+    'pdscanner_audio_seconds_total', 'Seconds of audio processed', ('source',)
+)
+PROCESSING_SECONDS = registry.counter(
+    'pdscanner_processing_seconds_total', 'Wall time spent processing that audio', ('source',)
+)
+REAL_TIME_FACTOR = registry.histogram(
+    'pdscanner_real_time_factor', 'Audio seconds processed per processing second',
+    ('source',), SPEED_BUCKETS
+)
+
+class Trace:
+    def __init__(self):
+        """
+        Stage timings collected for one request
+        """
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages.append((stage, seconds))
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            stages = list(self.stages)
+        return {
+            'total_seconds': round(time.perf_counter() - self.started, 4),
+            'stages': [{'stage': stage, 'seconds': round(seconds, 4)} for stage, seconds in stages]
+        }
+
+_local = threading.local()
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, 'trace', None)
+
+@contextmanager
+def trace(enabled: bool = True) -> Iterator[Optional[Trace]]:
+    """
+    Collect the stages timed on this thread into a Trace
+
+    Work handed to pools picks up the trace when submitted, so queue
+    waits and Whisper time show up in it too.
+    """
+    if not enabled:
+        yield None
+        return
+    previous = current_trace()
+    _local.trace = Trace()
+    try:
+        yield _local.trace
+    finally:
+        _local.trace = previous
+
+def record_stage(stage: str, seconds: float, trace: Optional[Trace] = None) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = trace or current_trace()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Time the enclosed block as one pipeline stage
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def record_queue_wait(queue: str, seconds: float, trace: Optional[Trace] = None) -> None:
+    QUEUE_WAIT_SECONDS.observe(seconds, queue=queue)
+    trace = trace or current_trace()
+    if trace is not None:
+        trace.add(f'queue:{queue}', seconds)
+
+def record_realtime(source: str, audio_seconds: float, seconds: float) -> None:
+    AUDIO_SECONDS.inc(audio_seconds, source=source)
+    PROCESSING_SECONDS.inc(seconds, source=source)
+    if seconds > 0:
+        REAL_TIME_FACTOR.observe(audio_seconds / seconds, source=source)
@@ -1,62 +1,134 @@
-import spacy
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional
+
+MODEL_NAME = "en_core_web_sm"
+
+# Entity types passed on to geocoding and the UI
+RELEVANT_TYPES = ['GPE', 'LOC', 'FAC', 'ORG', 'PERSON']
+
+_shared_model = None
+_shared_lock = threading.Lock()
+
+def _ner_only(nlp):
+    """
+    Disable every pipe that named entity recognition does not need
+
+    tok2vec is kept only when the ner component listens to it.
+    """
+    keep = {'ner'}
+    if 'tok2vec' in nlp.pipe_names:
+        listeners = getattr(nlp.get_pipe('tok2vec'), 'listening_components', [])
+        if 'ner' in listeners:
+            keep.add('tok2vec')
+    nlp.select_pipes(disable=[name for name in nlp.pipe_names if name not in keep])
+    return nlp
+
+def shared_model():
+    """
+    The process-wide NER pipeline, loaded once on first use
+    """
+    global _shared_model
+    if _shared_model is None:
+        with _shared_lock:
+            if _shared_model is None:
+                import spacy
+                try:
+                    _shared_model = _ner_only(spacy.load(MODEL_NAME))
+                except OSError:
+                    # If model isn't installed, provide helpful error
+                    raise OSError(
+                        "The English language model isn't installed. "
+                        f"Please install it with: python -m spacy download {MODEL_NAME}"
+                    )
+    return _shared_model
 
 class NLPProcessor:
-    def __init__(self):
-        """Initialize the NLP processor with the English language model"""
-        try:
-            self.nlp = spacy.load("en_core_web_sm")
-        except OSError:
-            # If model isn't installed, provide helpful error
-            raise OSError(
-                "The English language model isn't installed. "
-                "Please install it with: python -m spacy download en_core_web_sm"
-            )
+    def __init__(self, batch_size: int = 64, n_process: int = 1):
+        """Initialize the NLP processor with the shared English language model"""
+        self.nlp = shared_model()
+        self.batch_size = batch_size
+        self.n_process = n_process
 
     def extract_entities(self, text: str) -> List[Dict]:
         """
         Extract named entities from text
-        
+
         Args:
             text (str): The input text to process
-            
+
         Returns:
             List[Dict]: List of dictionaries containing entities and their types
         """
         try:
             doc = self.nlp(text)
             entities = []
-            
+
             for ent in doc.ents:
                 # Filter for relevant entity types
-                if ent.label_ in ['GPE', 'LOC', 'FAC', 'ORG', 'PERSON']:
+                if ent.label_ in RELEVANT_TYPES:
                     entities.append({
                         'entity': ent.text,
                         'type': ent.label_
                     })
-            
+
             return entities
-            
+
         except Exception as e:
             print(f"Error in entity extraction: {str(e)}")
             return []
 
+    def extract_entities_batch(self, segments: List[Dict],
+                               n_process: Optional[int] = None) -> List[Dict]:
+        """
+        Extract named entities from many transcript segments at once
+
+        Segments are streamed through nlp.pipe in batches; extra processes
+        are only started when there is enough text to keep them busy.
+
+        Args:
+            segments (List[Dict]): Segments with 'text', 'start' and 'end'
+            n_process (int): Worker processes, defaults to the instance setting
+
+        Returns:
+            List[Dict]: Entities with their segment index and timestamps
+        """
+        n_process = n_process or self.n_process
+        texts = [seg['text'] for seg in segments]
+        if len(texts) < self.batch_size * n_process:
+            n_process = 1
+
+        try:
+            entities = []
+            docs = self.nlp.pipe(texts, batch_size=self.batch_size, n_process=n_process)
+            for index, doc in enumerate(docs):
+                for ent in doc.ents:
+                    if ent.label_ in RELEVANT_TYPES:
+                        entities.append({
+                            'entity': ent.text,
+                            'type': ent.label_,
+                            'segment': index,
+                            'start': segments[index].get('start'),
+                            'end': segments[index].get('end')
+                        })
+            return entities
+
+        except Exception as e:
+            print(f"Error in batch entity extraction: {str(e)}")
+            return []
+
     def get_entity_types(self) -> List[str]:
         """
         Get list of available entity types
-        
+
         Returns:
             List[str]: List of entity type labels
         """
-        return ['GPE', 'LOC', 'FAC', 'ORG', 'PERSON']
-
-# For backwards compatibility
-nlp_model = spacy.load("en_core_web_sm")
+        return list(RELEVANT_TYPES)
 
 def extract_entities(text: str) -> List[Dict]:
     """
     Legacy function for backwards compatibility
     """
-    doc = nlp_model(text)
+    doc = shared_model()(text)
     entities = [{"entity": ent.text, "type": ent.label_} for ent in doc.ents]
     return entities
@@ -0,0 +1,306 @@
+import time
+import numpy as np
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from modules import audio, metrics
+from modules.ingest import TranscriptMerger
+
+class Pipeline:
+    def __init__(self, transcriber, nlp_processor, geo_locator, vad: bool = True,
+                 cache=None, config: Optional[Dict] = None, recorder=None,
+                 dedup: Optional[audio.FingerprintIndex] = None):
+        """
+        Chain the processing stages that turn decoded audio into results
+
+        Audio stays in memory as a NumPy array from decode to Whisper. With
+        vad enabled only detected speech is denoised and transcribed. An
+        optional ResultCache short-circuits audio seen before; config holds
+        the model settings that are hashed into its key. An optional
+        HistoryRecorder persists every analysed chunk. An optional
+        FingerprintIndex, shared across requests and feeds, lets repeated
+        or simulcast speech skip Whisper (VAD must be enabled).
+        """
+        self.transcriber = transcriber
+        self.nlp_processor = nlp_processor
+        self.geo_locator = geo_locator
+        self.vad = vad
+        self.cache = cache
+        self.config = dict(config or {}, vad=vad)
+        self.recorder = recorder
+        self.dedup = dedup
+
+    def run(self, samples: np.ndarray,
+            on_stage: Optional[Callable[[str, Any], None]] = None,
+            source: Optional[str] = None) -> Optional[Dict]:
+        """
+        Denoise, transcribe and analyse 16 kHz mono float32 samples
+
+        Args:
+            samples (np.ndarray): Output of audio.decode_audio
+            on_stage (callable): Optional callback receiving (stage, payload)
+                as partial results become available: 'transcription',
+                'entities', then one 'location' per geocoded place
+            source (str): Where the audio came from, stored with its history
+
+        Returns:
+            Dict: Response payload, or None if transcription failed
+        """
+        emit = on_stage or (lambda stage, payload: None)
+        started = time.perf_counter()
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(samples, self.config)
+            cached = self.cache.get(key)
+            if cached is not None:
+                emit('transcription', cached['transcription'])
+                emit('entities', cached['entities'])
+                for location in cached['locations']:
+                    emit('location', location)
+                return cached
+
+        transcription = self.transcribe(samples)
+        if not transcription:
+            return None
+        emit('transcription', format_transcription(transcription))
+
+        entities, locations = self.analyse(transcription['segments'], emit, source)
+        response = format_response(transcription, entities, locations)
+        if key is not None:
+            self.cache.put(key, response)
+        metrics.record_realtime(
+            'upload' if source and source.startswith('upload:') else 'stream',
+            len(samples) / audio.WHISPER_SAMPLE_RATE,
+            time.perf_counter() - started
+        )
+        return response
+
+    def run_windows(self, windows: Iterable[Tuple[np.ndarray, float]],
+                    on_stage: Optional[Callable[[str, Any], None]] = None,
+                    source: Optional[str] = None) -> Optional[Dict]:
+        """
+        Process a long recording as overlapping windows while it arrives
+
+        Each (samples, offset) window is transcribed and analysed as soon
+        as it is yielded; segments are stitched with a TranscriptMerger.
+        on_stage receives the running transcription and entities after
+        every window. The result cache is not used, since the audio is
+        never held in full.
+
+        Returns:
+            Dict: Response payload as from run(), or None if transcription failed
+        """
+        emit = on_stage or (lambda stage, payload: None)
+        started = time.perf_counter()
+        merger = TranscriptMerger()
+        segments: List[Dict] = []
+        entities: List[Dict] = []
+        locations: List[Dict] = []
+        language = None
+        audio_seconds = 0.0
+
+        for samples, offset in windows:
+            transcription = self.transcribe(samples)
+            if not transcription:
+                return None
+            audio_seconds = max(audio_seconds, offset + len(samples) / audio.WHISPER_SAMPLE_RATE)
+            if transcription['language'] != 'unknown':
+                language = language or transcription['language']
+            merged = merger.add(offset, transcription['segments'])
+            if not merged:
+                continue
+            first = len(segments)
+            segments.extend(merged)
+            emit('transcription', format_transcription(
+                {'full_text': _join(segments), 'segments': segments, 'language': language or 'unknown'}
+            ))
+
+            found, placed = self.analyse(
+                merged, lambda stage, payload: stage == 'location' and emit(stage, payload), source
+            )
+            for entity in found:
+                entity['segment'] += first
+            entities.extend(found)
+            locations.extend(placed)
+            emit('entities', entities)
+
+        transcription = {'full_text': _join(segments), 'segments': segments, 'language': language or 'unknown'}
+        metrics.record_realtime('upload', audio_seconds, time.perf_counter() - started)
+        return format_response(transcription, entities, locations)
+
+    def transcribe(self, samples: np.ndarray, denoise: bool = True,
+                   regions: Optional[List[Tuple[int, int]]] = None) -> Optional[Dict]:
+        """
+        Denoise and transcribe samples without the NER and geocoding stages
+
+        Segment times are always on the timeline of the samples passed in,
+        even when silence was cut out before Whisper. With VAD the noise
+        profile is measured on the non-speech parts; pass denoise=False
+        for audio that was already cleaned, e.g. by a feed's denoiser.
+        With a dedup index, speech regions that sound like recently
+        transcribed audio reuse its segments instead of going to Whisper.
+        regions, as sample ranges from audio.detect_speech, skips the VAD
+        for callers that have already run it.
+        """
+        speech_map = None
+        original = samples
+        reused: List[Dict] = []
+        fresh: List[Tuple[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]] = []
+        language = None
+        if self.vad:
+            if regions is None:
+                with metrics.timed('vad'):
+                    regions = audio.detect_speech(samples, audio.WHISPER_SAMPLE_RATE)
+            speech_map = audio.SpeechMap(regions, len(samples), audio.WHISPER_SAMPLE_RATE)
+            if not regions:
+                return {
+                    'full_text': '',
+                    'segments': [],
+                    'language': 'unknown',
+                    'vad': speech_map.summary()
+                }
+            run_map = speech_map
+            if self.dedup is not None:
+                with metrics.timed('fingerprint'):
+                    reused, fresh, language = self._deduplicate(samples, regions)
+                if not fresh:
+                    return {
+                        'full_text': _join(reused),
+                        'segments': reused,
+                        'language': language or 'unknown',
+                        'vad': speech_map.summary()
+                    }
+                run_map = audio.SpeechMap([region for region, _ in fresh], len(samples),
+                                          audio.WHISPER_SAMPLE_RATE)
+            samples = run_map.extract(samples)
+
+        if denoise:
+            with metrics.timed('denoise'):
+                try:
+                    denoiser = audio.SpectralDenoiser(audio.WHISPER_SAMPLE_RATE)
+                    if speech_map is not None:
+                        denoiser.estimate(original, speech_map.regions)
+                    samples = denoiser.apply(samples)
+                except Exception as e:
+                    print(f"Error reducing noise: {str(e)}")
+        with metrics.timed('transcribe'):
+            transcription = self.transcriber.transcribe_audio_with_timestamps(samples)
+        if transcription and speech_map is not None:
+            segments = run_map.remap_segments(transcription['segments'])
+            if fresh:
+                self._remember(fresh, segments, transcription['language'])
+            if reused:
+                segments = sorted(segments + reused, key=lambda seg: seg['start'])
+                transcription['full_text'] = _join(segments)
+            transcription['segments'] = segments
+            transcription['vad'] = speech_map.summary()
+        return transcription
+
+    def _deduplicate(self, samples: np.ndarray, regions: List[Tuple[int, int]]):
+        # Split regions into those heard recently, whose stored segments are
+        # moved onto this timeline, and fresh ones that still need Whisper
+        sr = audio.WHISPER_SAMPLE_RATE
+        reused, fresh = [], []
+        language = None
+        for start, end in regions:
+            prints = audio.fingerprint(samples[start:end], sr)
+            found = self.dedup.match(prints, (end - start) / sr)
+            if found is None:
+                fresh.append(((start, end), prints))
+                continue
+            value, offset = found
+            language = language or value['language']
+            shift = start / sr - offset * audio.FINGERPRINT_HOP / sr
+            for seg in value['segments']:
+                seg_start = max(seg['start'] + shift, start / sr)
+                seg_end = min(seg['end'] + shift, end / sr)
+                if seg_end > seg_start:
+                    reused.append(dict(seg, start=seg_start, end=seg_end))
+        return reused, fresh, language
+
+    def _remember(self, fresh, segments: List[Dict], language: str) -> None:
+        # Index each newly transcribed region with the segments that overlap it
+        # most, relative to the region start; silent results are kept too
+        sr = audio.WHISPER_SAMPLE_RATE
+        bounds = np.array([region for region, _ in fresh], dtype=np.float64) / sr
+        owned: List[List[Dict]] = [[] for _ in fresh]
+        for seg in segments:
+            overlap = np.minimum(bounds[:, 1], seg['end']) - np.maximum(bounds[:, 0], seg['start'])
+            best = int(np.argmax(overlap))
+            if overlap[best] > 0:
+                offset = float(bounds[best, 0])
+                owned[best].append(dict(seg, start=seg['start'] - offset, end=seg['end'] - offset))
+        for ((start, end), prints), own in zip(fresh, owned):
+            self.dedup.add(prints, (end - start) / sr, {'segments': own, 'language': language})
+
+    def analyse(self, segments: List[Dict],
+                on_stage: Optional[Callable[[str, Any], None]] = None,
+                source: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Extract entities from transcript segments and geocode the places
+
+        Segments go through NER as one batch; each entity carries the
+        index (into segments, blank ones included) and timestamps of the
+        segment it came from.
+
+        Returns:
+            tuple: (entities, locations)
+        """
+        emit = on_stage or (lambda stage, payload: None)
+        kept = [index for index, seg in enumerate(segments) if seg['text'].strip()]
+        if not kept:
+            emit('entities', [])
+            return [], []
+
+        with metrics.timed('ner'):
+            entities = self.nlp_processor.extract_entities_batch([segments[index] for index in kept])
+        for entity in entities:
+            # NER only saw the non-blank segments; point back at the originals
+            entity['segment'] = kept[entity['segment']]
+        emit('entities', entities)
+
+        try:
+            with metrics.timed('geocode'):
+                locations = self.geo_locator.locate_entities(
+                    entities,
+                    on_location=lambda location: emit('location', location)
+                )
+        except Exception as e:
+            print(f"Geocoding error: {str(e)}")
+            locations = []
+
+        if self.recorder is not None:
+            with metrics.timed('record'):
+                self.recorder.record(segments, entities, locations, source)
+        return entities, locations
+
+def _join(segments: List[Dict]) -> str:
+    return ' '.join(seg['text'].strip() for seg in segments)
+
+def format_transcription(transcription: Dict) -> Dict:
+    """
+    Reduce a transcriber result to the fields sent to clients
+    """
+    result = {
+        'full_text': transcription['full_text'],
+        'segments': [
+            {
+                'text': seg['text'],
+                'start': seg['start'],
+                'end': seg['end']
+            } for seg in transcription['segments']
+        ],
+        'language': transcription['language']
+    }
+    if 'vad' in transcription:
+        result['vad'] = transcription['vad']
+    return result
+
+def format_response(transcription: Dict, entities: List[Dict], locations: List[Dict]) -> Dict:
+    """
+    Build the JSON payload returned by the transcription endpoints
+    """
+    return {
+        'transcription': format_transcription(transcription),
+        'entities': entities,
+        'locations': locations
+    }
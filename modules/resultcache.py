@@ -0,0 +1,127 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from modules.db import ConnectionPool
+
+def ensure_schema(conn) -> None:
+    """
+    Create the transcription_cache table and its LRU index if missing
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS transcription_cache (
+        key TEXT PRIMARY KEY,
+        response TEXT,
+        size INTEGER,
+        last_access REAL
+    )
+    ''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_transcription_cache_access
+    ON transcription_cache (last_access)
+    ''')
+    conn.commit()
+
+class ResultCache:
+    def __init__(self, pool: ConnectionPool, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Content-addressed store of complete pipeline responses
+
+        Entries are keyed on a hash of the decoded PCM plus the settings
+        that shape the result, kept in a transcription_cache table and
+        evicted least recently used first once their JSON exceeds max_bytes.
+        """
+        self.pool = pool
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with pool.connection() as conn:
+            ensure_schema(conn)
+            self._total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM transcription_cache"
+            ).fetchone()[0]
+
+    @staticmethod
+    def key(samples: np.ndarray, config: Optional[Dict] = None) -> str:
+        """
+        Hash decoded samples together with the pipeline configuration
+        """
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(samples, dtype=np.float32).tobytes())
+        digest.update(json.dumps(config or {}, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(
+                    "SELECT response FROM transcription_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE transcription_cache SET last_access = ? WHERE key = ?",
+                        (time.time(), key)
+                    )
+                    conn.commit()
+        except sqlite3.Error as e:
+            print(f"Result cache read error: {str(e)}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response: Dict) -> None:
+        payload = json.dumps(response)
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        try:
+            with self.pool.connection() as conn, self._lock:
+                old = conn.execute(
+                    "SELECT size FROM transcription_cache WHERE key = ?", (key,)
+                ).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO transcription_cache (key, response, size, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, payload, size, time.time())
+                )
+                self._total += size - (old[0] if old else 0)
+                self._evict(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Result cache write error: {str(e)}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        while self._total > self.max_bytes:
+            rows = conn.execute(
+                "SELECT key, size FROM transcription_cache ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total = 0
+                return
+            for key, size in rows:
+                conn.execute("DELETE FROM transcription_cache WHERE key = ?", (key,))
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    return
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'bytes': self._total,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,278 @@
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from modules import audio, metrics
+from modules.ingest import StreamIngester, TranscriptMerger, WindowedIngester
+
+class Feed:
+    def __init__(self, stream_url: str, name: Optional[str] = None,
+                 max_backlog: int = 4, history: int = 500):
+        """
+        State of one monitored stream: pending speech chunks, transcript
+        merger, recent results and lag/drop counters
+        """
+        self.id = uuid.uuid4().hex
+        self.stream_url = stream_url
+        self.name = name or stream_url
+        self.started = time.time()
+        self.ingester: Optional[WindowedIngester] = None
+        self.merger = TranscriptMerger()
+        self.chunks = deque()
+        self.max_backlog = max_backlog
+        self.results = deque(maxlen=history)
+        self.activity = 0.0
+        self.scheduled = False
+        self.busy = False
+        self.running = True
+        self.seq = 0
+        self.windows = 0
+        self.silent_windows = 0
+        self.processed = 0
+        self.dropped_backlog = 0
+        self.dropped_stale = 0
+        self.last_lag = 0.0
+        self.max_lag_seen = 0.0
+        # Long-term VAD noise floor, so windows of steady hiss are not speech
+        self.speech_floor_db: Optional[float] = None
+
+    @property
+    def weight(self) -> float:
+        # Busier feeds get up to 4x the share of an idle one
+        return 1.0 + 3.0 * self.activity
+
+    def status(self) -> Dict:
+        ingester = self.ingester
+        return {
+            'feed_id': self.id,
+            'name': self.name,
+            'stream_url': self.stream_url,
+            'running': self.running and ingester is not None and ingester.is_alive(),
+            'started': self.started,
+            'activity': round(self.activity, 3),
+            'backlog': len(self.chunks),
+            'windows': self.windows,
+            'silent_windows': self.silent_windows,
+            'processed': self.processed,
+            'dropped_backlog': self.dropped_backlog,
+            'dropped_stale': self.dropped_stale,
+            'lag_seconds': round(self.last_lag, 3),
+            'max_lag_seconds': round(self.max_lag_seen, 3),
+            'seconds_buffered': ingester.seconds_buffered if ingester else 0.0,
+            'bytes_read': ingester.bytes_read if ingester else 0,
+            'reconnects': ingester.reconnects if ingester else 0,
+            'noise_floor_db': (
+                round(ingester.denoiser.noise_level, 1)
+                if ingester and ingester.denoiser and ingester.denoiser.has_profile else None
+            ),
+            'error': ingester.error if ingester else None
+        }
+
+class FeedScheduler:
+    def __init__(self, pipeline, workers: int = 2, max_backlog: int = 4,
+                 max_lag: float = 120.0, deadline: float = 30.0, denoise: bool = True):
+        """
+        Share a fixed set of transcription workers between many live feeds
+
+        Each feed's ingester runs the VAD on every window and queues only
+        windows with speech. Feeds with pending chunks wait in one priority
+        queue ordered by deadline: the capture time of their oldest chunk
+        plus deadline divided by the feed's activity weight, so busy feeds
+        are served sooner while quiet ones still get a turn. A feed is
+        processed by one worker at a time, which keeps its windows in order.
+        Chunks beyond max_backlog per feed, or older than max_lag seconds
+        when reached, are dropped and counted. With denoise, every feed
+        keeps its own streaming denoiser, so its noise profile is measured
+        once and then only tracked.
+        """
+        self.pipeline = pipeline
+        self.workers = workers
+        self.max_backlog = max_backlog
+        self.max_lag = max_lag
+        self.deadline = deadline
+        self.denoise = denoise
+        self._feeds: Dict[str, Feed] = {}
+        self._ready = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        # Notified whenever a worker finishes with a feed
+        self._idle = threading.Condition(self._lock)
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True, name=f"feed-worker-{i}")
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def register(self, stream_url: str, name: Optional[str] = None,
+                 window: float = 30.0, overlap: float = 5.0) -> Feed:
+        return self.attach(
+            stream_url,
+            lambda on_window, denoiser: StreamIngester(
+                stream_url, on_window, window, overlap, denoiser=denoiser
+            ),
+            name
+        )
+
+    def attach(self, source: str,
+               make_ingester: Callable[..., WindowedIngester],
+               name: Optional[str] = None) -> Feed:
+        """
+        Schedule windows from any WindowedIngester as a feed
+
+        make_ingester(on_window, denoiser) builds the ingester; source
+        names the feed and is stored with its history.
+        """
+        feed = Feed(source, name, self.max_backlog)
+        feed.ingester = make_ingester(
+            lambda samples, offset: self._on_window(feed, samples, offset),
+            audio.SpectralDenoiser() if self.denoise else None
+        )
+        with self._lock:
+            self._feeds[feed.id] = feed
+        feed.ingester.start()
+        return feed
+
+    def unregister(self, feed_id: str) -> Optional[Feed]:
+        with self._lock:
+            feed = self._feeds.pop(feed_id, None)
+            if feed is None:
+                return None
+            feed.running = False
+            feed.chunks.clear()
+        feed.ingester.stop()
+        return feed
+
+    def finish(self, feed_id: str, timeout: Optional[float] = None) -> Optional[Feed]:
+        """
+        Stop a feed's ingester, let its queued windows finish, then unregister it
+
+        The ingester is joined first so the partial window it flushes on
+        the way out is queued too. Windows still pending after timeout
+        seconds are dropped by unregister.
+        """
+        feed = self.get(feed_id)
+        if feed is None:
+            return None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        feed.ingester.stop()
+        feed.ingester.join(timeout)
+        with self._idle:
+            while feed.chunks or feed.busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._idle.wait(remaining)
+        return self.unregister(feed_id)
+
+    def get(self, feed_id: str) -> Optional[Feed]:
+        with self._lock:
+            return self._feeds.get(feed_id)
+
+    def feeds(self) -> List[Feed]:
+        with self._lock:
+            return list(self._feeds.values())
+
+    def _on_window(self, feed: Feed, samples: np.ndarray, offset: float) -> None:
+        # Runs on the feed's ingester thread; the VAD is cheap next to Whisper
+        floor = audio.noise_floor_db(samples, audio.WHISPER_SAMPLE_RATE)
+        regions = audio.detect_speech(samples, audio.WHISPER_SAMPLE_RATE,
+                                      noise_floor=feed.speech_floor_db)
+        speech = sum(end - start for start, end in regions) / max(len(samples), 1)
+        with self._lock:
+            if floor is not None:
+                # Follow a quieter channel at once, a noisier one slowly
+                if feed.speech_floor_db is None or floor < feed.speech_floor_db:
+                    feed.speech_floor_db = floor
+                else:
+                    feed.speech_floor_db += 0.1 * (floor - feed.speech_floor_db)
+            feed.windows += 1
+            feed.activity = 0.8 * feed.activity + 0.2 * speech
+            if not regions:
+                feed.silent_windows += 1
+                return
+            if len(feed.chunks) >= feed.max_backlog:
+                feed.chunks.popleft()
+                feed.dropped_backlog += 1
+            feed.chunks.append((samples, offset, time.time(), regions))
+            self._schedule(feed)
+
+    def _schedule(self, feed: Feed) -> None:
+        # Caller holds self._lock
+        if feed.running and feed.chunks and not feed.scheduled and not feed.busy:
+            captured = feed.chunks[0][2]
+            priority = captured + self.deadline / feed.weight
+            self._ready.put((priority, next(self._counter), feed))
+            feed.scheduled = True
+
+    def _work(self) -> None:
+        while True:
+            _, _, feed = self._ready.get()
+            with self._lock:
+                feed.scheduled = False
+                if not feed.running or not feed.chunks:
+                    continue
+                samples, offset, captured, regions = feed.chunks.popleft()
+                feed.busy = True
+            try:
+                lag = time.time() - captured
+                metrics.record_queue_wait('feeds', lag)
+                feed.last_lag = lag
+                feed.max_lag_seen = max(feed.max_lag_seen, lag)
+                if lag > self.max_lag:
+                    feed.dropped_stale += 1
+                    continue
+                started = time.perf_counter()
+                self._process(feed, samples, offset, regions)
+                metrics.record_realtime(
+                    'feed', len(samples) / audio.WHISPER_SAMPLE_RATE, time.perf_counter() - started
+                )
+            except Exception as e:
+                print(f"Error processing window from {feed.stream_url}: {str(e)}")
+            finally:
+                with self._lock:
+                    feed.busy = False
+                    self._schedule(feed)
+                    self._idle.notify_all()
+
+    def _process(self, feed: Feed, samples: np.ndarray, offset: float,
+                 regions: List[Tuple[int, int]]) -> None:
+        # The speech regions found against the feed's noise floor are reused,
+        # so the pipeline neither repeats the VAD nor second-guesses it
+        transcription = self.pipeline.transcribe(samples, denoise=not self.denoise, regions=regions)
+        feed.processed += 1
+        if not transcription:
+            return
+        segments = feed.merger.add(offset, transcription['segments'])
+        if not segments:
+            return
+        entities, locations = self.pipeline.analyse(segments, source=feed.stream_url)
+        with self._lock:
+            feed.seq += 1
+            feed.results.append({
+                'seq': feed.seq,
+                'segments': segments,
+                'entities': entities,
+                'locations': locations
+            })
+
+    def results_since(self, feed: Feed, seq: int = 0) -> List[Dict]:
+        with self._lock:
+            return [result for result in feed.results if result['seq'] > seq]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            feeds = list(self._feeds.values())
+            return {
+                'workers': self.workers,
+                'feeds': len(feeds),
+                'ready': self._ready.qsize(),
+                'backlog': sum(len(feed.chunks) for feed in feeds),
+                'busy': sum(1 for feed in feeds if feed.busy)
+            }
@@ -1,14 +1,91 @@
-import whisper
-import torch
 import os
+import numpy as np
+from typing import Dict, List, Optional, Union
+
+# Whisper works on fixed 30 s windows of 16 kHz audio; timestamp tokens
+# count in steps of 20 ms from the start of the window
+WINDOW_SAMPLES = 30 * 16000
+TIME_PRECISION = 0.02
+
+# model.transcribe arguments that whisper.DecodingOptions also accepts
+DECODING_FIELDS = (
+    'task', 'language', 'temperature', 'sample_len', 'best_of', 'beam_size',
+    'patience', 'length_penalty', 'suppress_tokens', 'suppress_blank', 'fp16'
+)
+
+# CPU inference profiles. "default" keeps Whisper's own decoding behaviour
+# (temperature fallback, conditioning on previous text, language detection);
+# "fast" quantizes linear layers to int8 and decodes greedily once.
+PROFILES = {
+    'default': {
+        'quantize': False,
+        'decode': {}
+    },
+    'fast': {
+        'quantize': True,
+        'decode': {
+            'language': 'en',
+            'beam_size': None,
+            'best_of': None,
+            'temperature': 0.0,
+            'condition_on_previous_text': False
+        }
+    }
+}
+
+def _to_plain_linear(model):
+    """
+    Swap Whisper's Linear subclass for torch.nn.Linear so dynamic
+    quantization, which matches modules by exact type, picks them up
+    """
+    import torch
+
+    for name, child in model.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            plain = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            plain.weight = child.weight
+            plain.bias = child.bias
+            setattr(model, name, plain)
+        else:
+            _to_plain_linear(child)
+    return model
 
 class WhisperTranscriber:
-    def __init__(self, model_name="base"):
+    def __init__(self, model_name="base", num_threads=None, profile="default",
+                 decode_options: Optional[Dict] = None):
         """
         Initialize Whisper model
         model_name can be one of: "tiny", "base", "small", "medium", "large"
+        num_threads caps torch intra-op threads so several workers can share
+        the CPU without oversubscribing it
+        profile picks an entry of PROFILES; decode_options override its
+        model.transcribe arguments (language, beam_size, temperature, ...)
         """
-        self.model = whisper.load_model(model_name)
+        # Imported here so importing this module stays cheap
+        import torch
+        import whisper
+
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown Whisper profile: {profile}")
+        if num_threads:
+            torch.set_num_threads(num_threads)
+            try:
+                # Parallelism comes from the worker pool, not inter-op threads
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                # Only allowed once, before any parallel work has started
+                pass
+
+        self.profile = profile
+        self.decode_options = dict(PROFILES[profile]['decode'], fp16=False)
+        self.decode_options.update(decode_options or {})
+
+        self.model = whisper.load_model(model_name, device="cpu")
+        if PROFILES[profile]['quantize']:
+            self.model = torch.quantization.quantize_dynamic(
+                _to_plain_linear(self.model), {torch.nn.Linear}, dtype=torch.qint8
+            )
+        self.model.eval()
         
     def transcribe_audio(self, audio_path):
         """
@@ -18,7 +95,7 @@ class WhisperTranscriber:
             if not os.path.exists(audio_path):
                 raise FileNotFoundError(f"Audio file not found: {audio_path}")
                 
-            result = self.model.transcribe(audio_path)
+            result = self.model.transcribe(audio_path, **self.decode_options)
             return {
                 'text': result['text'],
                 'segments': result.get('segments', []),
@@ -28,15 +105,18 @@ class WhisperTranscriber:
             print(f"Error transcribing audio: {str(e)}")
             return None
 
-    def transcribe_audio_with_timestamps(self, audio_path):
+    def transcribe_audio_with_timestamps(self, audio: Union[str, np.ndarray]):
         """
-        Transcribe audio file and return text with timestamp information
+        Transcribe audio and return text with timestamp information
+
+        audio may be a file path or 16 kHz mono float32 samples; arrays are
+        passed to Whisper directly so no second decode takes place.
         """
         try:
-            if not os.path.exists(audio_path):
-                raise FileNotFoundError(f"Audio file not found: {audio_path}")
+            if isinstance(audio, str) and not os.path.exists(audio):
+                raise FileNotFoundError(f"Audio file not found: {audio}")
                 
-            result = self.model.transcribe(audio_path)
+            result = self.model.transcribe(audio, **self.decode_options)
             segments = []
             
             for segment in result.get('segments', []):
@@ -55,3 +135,115 @@ class WhisperTranscriber:
         except Exception as e:
             print(f"Error transcribing audio with timestamps: {str(e)}")
             return None
+
+    def _decoding_options(self):
+        import whisper
+
+        options = {
+            key: value for key, value in self.decode_options.items()
+            if key in DECODING_FIELDS and value is not None
+        }
+        # Batches decode once, without transcribe()'s temperature fallback
+        temperature = options.get('temperature', 0.0)
+        if isinstance(temperature, (list, tuple)):
+            temperature = temperature[0]
+        options['temperature'] = temperature
+        if temperature == 0.0:
+            options.pop('best_of', None)
+        return whisper.DecodingOptions(without_timestamps=False, **options)
+
+    def _segments_from_tokens(self, tokenizer, tokens, offset: float, duration: float) -> List[Dict]:
+        """
+        Split one window's decoded tokens into segments at timestamp tokens
+        """
+        segments = []
+        start = None
+        text_tokens = []
+
+        def close(end):
+            text = tokenizer.decode(text_tokens).strip()
+            if text:
+                segments.append({
+                    'text': text,
+                    'start': round(offset + (start or 0.0), 3),
+                    'end': round(offset + end, 3)
+                })
+
+        for token in tokens:
+            if token < tokenizer.timestamp_begin:
+                text_tokens.append(token)
+                continue
+            time = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+            if start is not None and text_tokens:
+                close(time)
+                start = None
+            else:
+                start = time
+            text_tokens = []
+        if text_tokens:
+            close(duration)
+        return segments
+
+    def transcribe_batch(self, clips: List[np.ndarray], batch_size: int = 16) -> List[Optional[Dict]]:
+        """
+        Transcribe several clips with shared encoder and decoder passes
+
+        Every clip is cut into 30 s windows; the log-mel spectrograms of all
+        windows, padded to full length, are stacked and decoded batch_size
+        at a time. Segments are split back per clip with their window
+        offsets added. Each window is decoded once at the profile's first
+        temperature, so results can differ slightly from
+        transcribe_audio_with_timestamps on long or hard clips.
+
+        Returns:
+            list: One transcription dict (or None on failure) per clip
+        """
+        import torch
+        import whisper
+        from whisper.tokenizer import get_tokenizer
+
+        try:
+            n_mels = self.model.dims.n_mels
+            windows = []
+            for index, samples in enumerate(clips):
+                samples = np.asarray(samples, dtype=np.float32)
+                for start in range(0, max(len(samples), 1), WINDOW_SAMPLES):
+                    chunk = samples[start:start + WINDOW_SAMPLES]
+                    windows.append((index, start / 16000, len(chunk) / 16000, chunk))
+
+            options = self._decoding_options()
+            tokenizer = get_tokenizer(
+                self.model.is_multilingual,
+                num_languages=self.model.num_languages,
+                task=options.task
+            )
+            segments = [[] for _ in clips]
+            languages = [None] * len(clips)
+
+            for first in range(0, len(windows), batch_size):
+                group = windows[first:first + batch_size]
+                mel = torch.stack([
+                    whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(chunk)), n_mels)
+                    for _, _, _, chunk in group
+                ]).to(self.model.device)
+                with torch.no_grad():
+                    results = whisper.decode(self.model, mel, options)
+                for (index, offset, duration, _), result in zip(group, results):
+                    languages[index] = languages[index] or result.language
+                    if result.no_speech_prob > 0.6 and result.avg_logprob < -1.0:
+                        continue
+                    segments[index].extend(
+                        self._segments_from_tokens(tokenizer, result.tokens, offset, duration)
+                    )
+
+            return [
+                {
+                    'full_text': ' '.join(seg['text'] for seg in clip_segments),
+                    'segments': clip_segments,
+                    'language': languages[index] or 'unknown'
+                }
+                for index, clip_segments in enumerate(segments)
+            ]
+        except Exception as e:
+            print(f"Error transcribing batch: {str(e)}")
+            return [None] * len(clips)
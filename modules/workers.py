@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from modules import metrics
+
+class PoolBusyError(Exception):
+    """Raised when the inference queue stays full past the submit timeout"""
+
+def default_workers(threads_per_worker: int = 2) -> int:
+    """
+    Number of workers that fit the available cores without oversubscribing
+
+    Args:
+        threads_per_worker (int): Intra-op threads each worker will use
+
+    Returns:
+        int: Worker count, at least 1
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, threads_per_worker))
+
+class WorkerPool:
+    def __init__(self, factory: Callable[[], Any], workers: Optional[int] = None,
+                 queue_size: Optional[int] = None, queue_timeout: float = 30.0,
+                 name: str = "worker"):
+        """
+        Bounded pool of threads that each own a private model instance
+
+        factory is called once per worker thread, on its first task, so no
+        model object is ever shared between threads. At most
+        workers + queue_size tasks are admitted at once; further submits
+        block for up to queue_timeout seconds and then raise PoolBusyError.
+        """
+        self.factory = factory
+        self.workers = workers or default_workers()
+        self.queue_size = self.workers * 4 if queue_size is None else queue_size
+        self.queue_timeout = queue_timeout
+        self.name = name
+        self._local = threading.local()
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._loaded = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix=name
+        )
+
+    def _call(self, fn: Callable, args: tuple, kwargs: dict,
+              submitted: float, trace: Optional[metrics.Trace]) -> Any:
+        metrics.record_queue_wait(self.name, time.perf_counter() - submitted, trace)
+        model = getattr(self._local, 'model', None)
+        if model is None:
+            model = self.factory()
+            self._local.model = model
+            with self._lock:
+                self._loaded += 1
+        return fn(model, *args, **kwargs)
+
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Queue fn(model, *args, **kwargs) on the next free worker
+
+        Returns:
+            Future: Resolves to the return value of fn
+
+        Raises:
+            PoolBusyError: If no queue slot frees up within queue_timeout
+        """
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PoolBusyError(
+                f"Inference queue full ({self.workers} workers, "
+                f"{self.queue_size} queued)"
+            )
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(
+                self._call, fn, args, kwargs, time.perf_counter(), metrics.current_trace()
+            )
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Submit fn and block until its result is available
+        """
+        return self.submit(fn, *args, **kwargs).result()
+
+    def warmup(self, timeout: float = 600.0) -> None:
+        """
+        Make every worker build its model now rather than on first request
+        """
+        barrier = threading.Barrier(self.workers)
+        # Each task holds its thread at the barrier, so every worker gets one
+        futures = [
+            self.submit(lambda model: barrier.wait(timeout))
+            for _ in range(self.workers)
+        ]
+        for future in futures:
+            future.result()
+
+    @property
+    def loaded(self) -> int:
+        return self._loaded
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = self._pending
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'pending': pending,
+            'loaded': self._loaded
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+class TranscriberPool(WorkerPool):
+    def __init__(self, factory: Callable[[], Any], workers: Optional[int] = None,
+                 queue_size: Optional[int] = None, queue_timeout: float = 30.0,
+                 name: str = "worker", max_batch: int = 1):
+        """
+        WorkerPool of WhisperTranscriber instances with the transcriber interface
+
+        With max_batch above 1, clips waiting for a worker are collected
+        and the next free worker transcribes up to max_batch of them in one
+        transcribe_batch call. An idle pool still starts each clip at once;
+        batches only grow while every worker is busy.
+        """
+        super().__init__(factory, workers, queue_size, queue_timeout, name)
+        self.max_batch = max_batch
+        self._waiting = deque()
+        self._batch_lock = threading.Lock()
+        self.batches = 0
+        self.batched_clips = 0
+
+    def transcribe_audio_with_timestamps(self, audio):
+        if self.max_batch <= 1 or isinstance(audio, str):
+            return self.run(lambda model, a: model.transcribe_audio_with_timestamps(a), audio)
+
+        item = (audio, Future())
+        with self._batch_lock:
+            self._waiting.append(item)
+        try:
+            # One task per clip keeps queue admission per clip; a task that
+            # finds the clips already taken by an earlier batch just returns
+            self.submit(self._drain)
+        except PoolBusyError:
+            with self._batch_lock:
+                # Compared by identity: tuples holding arrays can't use ==
+                queued = any(waiting is item for waiting in self._waiting)
+                if queued:
+                    self._waiting = deque(w for w in self._waiting if w is not item)
+            if queued:
+                raise
+            # Already picked up by a running batch
+        return item[1].result()
+
+    def _drain(self, model) -> None:
+        with self._batch_lock:
+            items = [self._waiting.popleft() for _ in range(min(self.max_batch, len(self._waiting)))]
+            if items:
+                self.batches += 1
+                self.batched_clips += len(items)
+        if not items:
+            return
+        try:
+            results = model.transcribe_batch([audio for audio, _ in items])
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        if self.max_batch > 1:
+            with self._batch_lock:
+                stats.update({
+                    'max_batch': self.max_batch,
+                    'batches': self.batches,
+                    'mean_batch': self.batched_clips / self.batches if self.batches else 0.0
+                })
+        return stats